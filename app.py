@@ -1,178 +1,345 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
-import os
+from datetime import date
+
+from flask import (
+    Flask, Response, abort, make_response, render_template, request, redirect, url_for, jsonify
+)
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import state
-from prompt_manager import load_prompts, save_prompts
-from query_generator import generate_queries_for_driver
-from search_executor import run_search
-from deduplicator import deduplicate_search_results
-from fetcher import fetch_article
-from article_evaluator import evaluate_article
+import jobs
+import search_cache
+import article_store
+import eval_cache
+import metrics
+from pipeline import run_search_pipeline, RUN_MODES
 
 load_dotenv()
 
-SEARCH_FRESHNESS_DAYS = int(os.getenv("SEARCH_FRESHNESS_DAYS", 4))
-
 app = Flask(__name__)
-state.load()
+state.get_workspace()
+
+# Remembers the browser's current workspace between requests
+WORKSPACE_COOKIE = "workspace"
+
+
+def _workspace() -> state.Workspace:
+    """
+    Workspace for this request: an explicit `workspace` parameter, else
+    the one last opened in this browser, else the default workspace.
+    """
+    name = request.values.get("workspace")
+    if name:
+        workspace = _find_workspace(name)
+        if workspace is None:
+            abort(make_response(jsonify({"error": f"Unknown workspace '{name}'"}), 404))
+        return workspace
+
+    return _find_workspace(request.cookies.get(WORKSPACE_COOKIE)) or state.get_workspace()
+
+
+def _find_workspace(name):
+    try:
+        return state.get_workspace(name) if name else None
+    except ValueError:
+        return None
 
 
 # ---------------- HOME ----------------
 @app.route("/")
 def home():
-    return render_template("home.html", data=state.data)
+    workspace = _workspace()
+    running = jobs.manager.active(kind="search", workspace=workspace.name)
+
+    with workspace.lock:
+        return render_template(
+            "home.html",
+            data=workspace.data,
+            workspace=workspace.name,
+            workspaces=state.list_workspaces(),
+            active_job_id=running[0].id if running else None
+        )
+
+
+# ---------------- WORKSPACES ----------------
+@app.route("/workspaces", methods=["GET", "POST"])
+def workspaces():
+    """
+    GET lists workspaces; POST opens `name` in this browser, creating it
+    (with a copy of the default prompts) if it does not exist yet.
+    """
+    if request.method == "GET":
+        return jsonify({"workspaces": state.list_workspaces(), "current": _workspace().name})
+
+    name = request.form.get("name", "").strip()
+    try:
+        workspace = state.get_workspace(name, create=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    response = redirect(url_for("home"))
+    response.set_cookie(WORKSPACE_COOKIE, workspace.name, samesite="Lax")
+    return response
 
 
 # ---------------- CONTEXT ----------------
 @app.route("/context", methods=["GET", "POST"])
 def context():
-    if request.method == "POST":
-        state.data["context"] = request.form.get("context", "").strip()
-        state.data["metric"] = request.form.get("metric", "").strip()
-        drivers = request.form.getlist("drivers[]")
-
-        state.data["drivers"] = [d.strip() for d in drivers if d.strip()]
-
-        # 🔥 Reset downstream cached data
-        state.data["queries"] = {}
-        state.data["search_results"] = {}
+    workspace = _workspace()
+    data = workspace.data
 
-        state.save()
+    if request.method == "POST":
+        with workspace.lock:
+            # A running search keeps writing results for the old settings
+            conflict = _search_running(workspace)
+            if conflict:
+                return conflict
+
+            old_context = data["context"]
+            old_metric = data["metric"]
+            old_drivers = data["drivers"]
+
+            data["context"] = request.form.get("context", "").strip()
+            data["metric"] = request.form.get("metric", "").strip()
+            drivers = request.form.getlist("drivers[]")
+
+            data["drivers"] = [d.strip() for d in drivers if d.strip()]
+            workspace.save()
+
+            if (data["context"], data["metric"]) != (old_context, old_metric):
+                # 🔥 Every query depends on context + metric: reset downstream data
+                workspace.reset_results()
+            else:
+                # Only drivers that were removed, added or edited are affected
+                new_drivers = data["drivers"]
+                workspace.drop_drivers([d for d in old_drivers if d not in new_drivers])
+                workspace.set_stale_drivers([
+                    d for d in new_drivers
+                    if d not in old_drivers or d in data["stale_drivers"]
+                ])
         return redirect(url_for("home"))
 
-    return render_template("context.html", data=state.data)
+    return render_template("context.html", data=data)
 
 
 # ---------------- START SEARCH ----------------
 @app.route("/start-search", methods=["POST"])
 def start_search():
-    context = state.data.get("context")
-    metric = state.data.get("metric")
-    drivers = state.data.get("drivers", [])
+    workspace = _workspace()
+
+    # Held until the run is registered, so /context and /prompts cannot
+    # change the workspace between these reads and the start of the run
+    with workspace.lock:
+        return _start_search(workspace)
+
+
+def _start_search(workspace):
+    context = workspace.data.get("context")
+    metric = workspace.data.get("metric")
+    drivers = list(workspace.data.get("drivers", []))
 
     if not context or not metric or not drivers:
         return jsonify({"error": "Context, metric, or drivers missing"}), 400
 
-    # 🔥 ALWAYS reset old results before running
-    state.data["queries"] = {}
-    state.data["search_results"] = {}
-    state.save()
-
-    # ---------- STEP 1: QUERY GENERATION ----------
-    queries_by_driver = {}
-
-    for driver in drivers:
-        try:
-            queries = generate_queries_for_driver(context, metric, driver)
-            queries_by_driver[driver] = queries
-        except Exception as e:
-            print(f"Query generation failed for driver '{driver}':", e)
-            queries_by_driver[driver] = []
-
-    state.data["queries"] = queries_by_driver
-    state.save()
-
-    # ---------- STEP 2: BRAVE SEARCH ----------
-    raw_search_results = run_search(
-        queries_by_driver,
-        days=SEARCH_FRESHNESS_DAYS
-    )
+    # full: start over | incremental: only URLs no earlier run has processed
+    # partial: only drivers added or edited since the last run
+    mode = request.values.get("mode", "full")
+    if mode not in RUN_MODES:
+        return jsonify({"error": f"Unknown mode '{mode}'"}), 400
+
+    if mode == "partial":
+        drivers = [d for d in drivers if d in workspace.data.get("stale_drivers", [])]
+        if not drivers:
+            return jsonify({"error": "No changed drivers to update"}), 400
+
+    # Runs write into their workspace, so only one per workspace at a time;
+    # other workspaces may run concurrently
+    try:
+        job = jobs.manager.submit(
+            "search", run_search_pipeline, workspace, context, metric, drivers,
+            mode=mode, workspace=workspace.name, exclusive=True
+        )
+    except jobs.JobConflict as e:
+        return jsonify({
+            "error": "A search is already running",
+            "job_id": e.job.id
+        }), 409
 
-    # ---------- STEP 3: DEDUPLICATION ----------
-    deduped_results = deduplicate_search_results(
-        raw_search_results,
-        simhash_threshold=5
-    )
+    return jsonify({
+        "status": "started",
+        "job_id": job.id,
+        "status_url": url_for("job_status", job_id=job.id)
+    }), 202
 
-    # ---------- STEP 4: PARALLEL ARTICLE EVALUATION ----------
-    final_results = {}
-
-    tasks = []
-    for driver, queries in deduped_results.items():
-        for query, results in queries.items():
-            for item in results:
-                tasks.append((driver, query, item))
-
-    def process_article(driver, query, item):
-        try:
-            article_text = fetch_article(item.get("url", ""))
-            if not article_text:
-                return None
-
-            evaluation = evaluate_article(
-                article=article_text,
-                context=context,
-                metric=metric,
-                driver=driver,
-                query=query
-            )
-
-            return {
-                "driver": driver,
-                "query": query,
-                "title": item.get("title"),
-                "url": item.get("url"),
-                "source": item.get("source"),
-                "published": item.get("published"),
-                "rank": item.get("rank"),
-                "score": evaluation.get("score"),
-                "summary": evaluation.get("summary"),
-            }
-
-        except Exception as e:
-            print("Article processing failed:", e)
-            return None
-
-    with ThreadPoolExecutor() as executor:
-        futures = [
-            executor.submit(process_article, d, q, i)
-            for d, q, i in tasks
-        ]
-
-        for future in as_completed(futures):
-            result = future.result()
-            if not result:
-                continue
-
-            d = result.pop("driver")
-            q = result.pop("query")
-
-            final_results.setdefault(d, {}).setdefault(q, []).append(result)
-
-    state.data["search_results"] = final_results
-    state.save()
 
+def _search_running(workspace):
+    """
+    409 response if a search is still writing to `workspace`, else None.
+    """
+    running = jobs.manager.active(kind="search", workspace=workspace.name)
+    if not running:
+        return None
+
+    return jsonify({
+        "error": "A search is running in this workspace; wait for it or cancel it first",
+        "job_id": running[0].id
+    }), 409
+
+
+# ---------------- JOBS ----------------
+@app.route("/jobs", methods=["GET"])
+def list_jobs():
+    return jsonify([job.to_dict() for job in jobs.manager.list()])
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = jobs.manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Unknown job"}), 404
+
+    return jsonify(job.to_dict())
+
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    job = jobs.manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Unknown job"}), 404
+
+    job.cancel()
+    return jsonify(job.to_dict())
+
+
+@app.route("/jobs/<job_id>/results", methods=["GET"])
+def job_results(job_id):
+    """
+    Partial (or final) output of a run, as written to its workspace so far.
+    """
+    job = jobs.manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Unknown job"}), 404
+
+    workspace = state.get_workspace(job.workspace or state.DEFAULT_WORKSPACE)
+    with workspace.lock:
+        payload = {
+            "job": job.to_dict(),
+            "queries": workspace.data.get("queries", {}),
+            "search_results": workspace.data.get("search_results", {}),
+        }
+        return jsonify(payload)
+
+
+# ---------------- RESULTS API ----------------
+@app.route("/api/results", methods=["GET"])
+def api_results():
+    """
+    Stored results, filtered and sorted in SQLite, one page at a time.
+    Pass `next_cursor` from a response as `cursor` to get the next page.
+    """
+    args = request.args
+    try:
+        results, next_cursor = _workspace().query_results(
+            driver=args.get("driver") or None,
+            query=args.get("query") or None,
+            min_score=_optional_int(args.get("min_score")),
+            source=args.get("source") or None,
+            published_after=_optional_date(args.get("published_after")),
+            published_before=_optional_date(args.get("published_before")),
+            sort=args.get("sort", "score"),
+            cursor=args.get("cursor") or None,
+            limit=min(max(args.get("limit", 50, type=int), 1), 200)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"results": results, "next_cursor": next_cursor})
+
+
+def _optional_int(value):
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Expected an integer, got '{value}'")
+
+
+def _optional_date(value):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"Expected a YYYY-MM-DD date, got '{value}'")
+
+
+# ---------------- RUN HISTORY ----------------
+@app.route("/runs", methods=["GET"])
+def list_runs():
+    """
+    Per-run timing breakdown of recent runs (newest first).
+    """
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 200)
+    return jsonify(_workspace().list_runs(limit))
+
+
+# ---------------- METRICS ----------------
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# ---------------- CACHES ----------------
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
     return jsonify({
-        "status": "success",
-        "drivers": len(drivers),
-        "queries_generated": sum(len(v) for v in queries_by_driver.values()),
-        "articles_processed": len(tasks),
-        "parallel_execution": True
+        "search": search_cache.stats(),
+        "articles": article_store.stats(),
+        "evaluations": eval_cache.stats()
     })
 
 
 # ---------------- PROMPTS ----------------
 @app.route("/prompts", methods=["GET", "POST"])
 def manage_prompts():
-    if request.method == "POST":
-        prompts = load_prompts()
+    workspace = _workspace()
+    store = workspace.prompts
 
-        # Values are STRINGS (as per your fixed structure)
-        for key in prompts.keys():
-            if key in request.form:
-                prompts[key] = request.form.get(key, "").strip()
-
-        save_prompts(prompts)
+    if request.method == "POST":
+        with workspace.lock:
+            conflict = _search_running(workspace)
+            if conflict:
+                return conflict
+            _save_prompts(store)
         return redirect(url_for("home"))
 
     return render_template(
         "prompts.html",
-        prompts=load_prompts()
+        prompts=store.load(),
+        versions=store.versions()
     )
 
 
+def _save_prompts(store):
+    prompts = store.load()
+    old_eval_instructions = prompts.get("ARTICLE_EVALUATION_INSTRUCTIONS", "").strip()
+
+    # Values are STRINGS (as per your fixed structure)
+    for key in prompts.keys():
+        if key in request.form:
+            prompts[key] = request.form.get(key, "").strip()
+
+    store.save(prompts)
+
+    # Only evaluations scored under the old evaluation prompt are stale,
+    # and only once no other workspace (e.g. one copied from this) uses it
+    new_eval_instructions = prompts.get("ARTICLE_EVALUATION_INSTRUCTIONS", "").strip()
+    if new_eval_instructions != old_eval_instructions and not state.prompt_in_use(
+        "ARTICLE_EVALUATION_INSTRUCTIONS", old_eval_instructions
+    ):
+        eval_cache.invalidate_prompt(old_eval_instructions)
+
+
 # ---------------- RUN ----------------
 if __name__ == "__main__":
     app.run(debug=True)
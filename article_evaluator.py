@@ -1,16 +1,37 @@
 import os
 import json
 from dotenv import load_dotenv
-from openai import OpenAI
+from llm import chat, LLMUnavailable, MODEL
 from prompt_manager import load_prompts
+from relevance import select_passages, estimate_tokens
+import eval_cache
+import metrics
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-MAX_ARTICLE_CHARS = 8000
 MIN_ARTICLE_CHARS = 500
 
+# Article tokens sent per evaluation; longer articles are cut down to
+# their most relevant passages (see relevance.select_passages)
+EVAL_ARTICLE_TOKEN_BUDGET = int(os.getenv("EVAL_ARTICLE_TOKEN_BUDGET", 1500))
+
+# Batch mode (opt-in): several articles for one driver/query per request
+EVAL_BATCH_SIZE = int(os.getenv("EVAL_BATCH_SIZE", 0))
+EVAL_BATCH_TOKEN_BUDGET = int(os.getenv("EVAL_BATCH_TOKEN_BUDGET", 12000))
+
+INSUFFICIENT_CONTENT_RESULT = {
+    "score": 1,
+    "summary": "Article content unavailable or insufficient for reliable evaluation."
+}
+FAILED_EVALUATION_RESULT = {
+    "score": 1,
+    "summary": "Article could not be reliably evaluated."
+}
+
+# USD per 1M tokens (gpt-4o-mini list price)
+INPUT_COST_PER_MTOK = float(os.getenv("LLM_INPUT_COST_PER_MTOK", 0.15))
+OUTPUT_COST_PER_MTOK = float(os.getenv("LLM_OUTPUT_COST_PER_MTOK", 0.60))
+
 
 # --------------------------------------------------
 # Safe JSON parsing
@@ -41,6 +62,120 @@ def _safe_json_parse(text: str) -> dict:
     raise ValueError("Invalid JSON returned by LLM")
 
 
+def _safe_json_parse_list(text: str) -> list:
+    """
+    Batch responses: a JSON array, or an object wrapping one under "results".
+    """
+    if not text:
+        raise ValueError("Empty LLM response")
+
+    text = text.strip()
+
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text.replace("json", "", 1).strip()
+
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        start = text.find("[")
+        end = text.rfind("]")
+        if start == -1 or end == -1:
+            raise ValueError("Invalid JSON returned by LLM")
+        parsed = json.loads(text[start:end + 1])
+
+    if isinstance(parsed, dict):
+        parsed = parsed.get("results")
+
+    if not isinstance(parsed, list):
+        raise ValueError("Batch response is not a JSON array")
+
+    return parsed
+
+
+def _validate_evaluation(parsed: dict) -> dict:
+    # Hard validation
+    score = int(parsed.get("score", 1))
+    score = min(max(score, 1), 5)
+
+    summary = str(parsed.get("summary", "")).strip()
+
+    return {
+        "score": score,
+        "summary": summary or "No summary returned."
+    }
+
+
+def _cost_usd(response) -> float:
+    usage = getattr(response, "usage", None)
+    if not usage:
+        return 0.0
+
+    return (
+        usage.prompt_tokens * INPUT_COST_PER_MTOK
+        + usage.completion_tokens * OUTPUT_COST_PER_MTOK
+    ) / 1_000_000
+
+
+# --------------------------------------------------
+# Prompt layout
+# --------------------------------------------------
+# Bump when the envelope below changes, so cached evaluations are not reused
+EVALUATION_PROMPT_VERSION = "2"
+
+
+def _evaluation_prefix(context: str, metric: str, user_instruction: str) -> str:
+    """
+    Everything that is identical across a run's evaluation calls.
+    It is sent first so provider-side prompt caching can reuse it;
+    the per-article tail (driver, query, article, format) follows.
+    """
+
+    # 🔒 Hard system envelope (NOT user editable)
+    return f"""
+You are an expert equity research and market intelligence analyst.
+
+You must evaluate articles strictly as EXTERNAL SIGNALS.
+
+Evaluation Rules:
+- Assign a relevance score from 1 to 5
+- Score reflects how strongly the article indicates movement in the metric via the driver
+- Generate a concise executive summary (max 3 sentences)
+- Do NOT speculate or add external knowledge
+- Base judgment ONLY on the article
+- When several articles are given, evaluate each one independently
+
+User Guidance:
+{user_instruction}
+
+Context:
+{context}
+
+Target Metric:
+{metric}
+""".strip()
+
+
+def _messages(context: str, metric: str, user_instruction: str, tail: str) -> list[dict]:
+    return [
+        {"role": "system", "content": _evaluation_prefix(context, metric, user_instruction)},
+        {"role": "user", "content": tail},
+    ]
+
+
+def _cached_evaluation(cache_key: str):
+    cached = eval_cache.get(cache_key)
+    metrics.EVAL_CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+    return cached
+
+
+def _cache_key(article, context, metric, driver, query, user_instruction) -> str:
+    return eval_cache.make_key(
+        article, context, metric, driver, query, user_instruction,
+        f"{MODEL}/prompt-v{EVALUATION_PROMPT_VERSION}"
+    )
+
+
 # --------------------------------------------------
 # Article Evaluation (LLM)
 # --------------------------------------------------
@@ -49,35 +184,34 @@ def evaluate_article(
     context: str,
     metric: str,
     driver: str,
-    query: str
+    query: str,
+    prompts: dict = None
 ) -> dict:
     """
     Scores and summarizes an article using OpenAI.
-    Always fails gracefully.
+    `truncation` in the result tells how the article was cut to fit
+    EVAL_ARTICLE_TOKEN_BUDGET. Bad model output yields FAILED_EVALUATION_RESULT;
+    raises LLMUnavailable if the API is still failing after the gateway's retries.
+    `prompts` defaults to the global prompt store.
     """
 
     # 🚫 Do NOT waste credits on junk articles
     if not article or len(article) < MIN_ARTICLE_CHARS:
-        return {
-            "score": 1,
-            "summary": "Article content unavailable or insufficient for reliable evaluation."
-        }
+        return dict(INSUFFICIENT_CONTENT_RESULT)
 
-    prompts = load_prompts()
+    prompts = prompts if prompts is not None else load_prompts()
     user_instruction = prompts.get("ARTICLE_EVALUATION_INSTRUCTIONS", "").strip()
+    article, truncation = select_passages(
+        article, driver, query, metric, EVAL_ARTICLE_TOKEN_BUDGET
+    )
 
-    # 🔒 Hard system envelope (NOT user editable)
-    system_prompt = f"""
-You are an expert equity research and market intelligence analyst.
-
-You must evaluate the article strictly as an EXTERNAL SIGNAL.
-
-Context:
-{context}
-
-Target Metric:
-{metric}
+    # ♻️ Same inputs as an earlier run -> reuse its evaluation
+    cache_key = _cache_key(article, context, metric, driver, query, user_instruction)
+    cached = _cached_evaluation(cache_key)
+    if cached is not None:
+        return {**cached, "truncation": truncation}
 
+    tail = f"""
 Driver:
 {driver}
 
@@ -86,19 +220,9 @@ Search Query:
 
 Article Content:
 \"\"\"
-{article[:MAX_ARTICLE_CHARS]}
+{article}
 \"\"\"
 
-Evaluation Rules:
-- Assign a relevance score from 1 to 5
-- Score reflects how strongly the article indicates movement in the metric via the driver
-- Generate a concise executive summary (max 3 sentences)
-- Do NOT speculate or add external knowledge
-- Base judgment ONLY on the article
-
-User Guidance:
-{user_instruction}
-
 OUTPUT FORMAT (STRICT JSON ONLY):
 {{
   "score": <integer 1-5>,
@@ -107,31 +231,171 @@ OUTPUT FORMAT (STRICT JSON ONLY):
 """.strip()
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": system_prompt}],
-            temperature=0
-        )
+        response = chat(_messages(context, metric, user_instruction, tail), "evaluation")
 
         content = response.choices[0].message.content
         parsed = _safe_json_parse(content)
 
-        # Hard validation
-        score = int(parsed.get("score", 1))
-        score = min(max(score, 1), 5)
+        evaluation = _validate_evaluation(parsed)
 
-        summary = parsed.get("summary", "").strip()
+        eval_cache.put(cache_key, user_instruction, evaluation, _cost_usd(response))
+        return {**evaluation, "truncation": truncation}
 
-        return {
-            "score": score,
-            "summary": summary or "No summary returned."
-        }
+    except LLMUnavailable:
+        # Not a verdict on the article; let the caller retry it later
+        raise
 
     except Exception as e:
         print("Article evaluation failed:", e)
+        if isinstance(e, ValueError):
+            metrics.LLM_PARSE_FAILURES.inc(purpose="evaluation")
 
         # ✅ NEVER crash pipeline
-        return {
-            "score": 1,
-            "summary": "Article could not be reliably evaluated."
-        }
+        return {**FAILED_EVALUATION_RESULT, "truncation": truncation}
+
+
+# --------------------------------------------------
+# Batched Article Evaluation (LLM)
+# --------------------------------------------------
+def batch_mode_enabled() -> bool:
+    return EVAL_BATCH_SIZE > 1
+
+
+def evaluate_articles(
+    articles: list[str],
+    context: str,
+    metric: str,
+    driver: str,
+    query: str,
+    prompts: dict = None
+) -> list[dict]:
+    """
+    Scores several articles for the same driver/query, packing them into
+    as few requests as EVAL_BATCH_SIZE / EVAL_BATCH_TOKEN_BUDGET allow.
+    Returns one {score, summary, truncation} per input article, in order.
+    A malformed batch falls back to per-article `evaluate_article` calls;
+    LLMUnavailable is raised as-is.
+    """
+
+    results = [None] * len(articles)
+
+    prompts = prompts if prompts is not None else load_prompts()
+    user_instruction = prompts.get("ARTICLE_EVALUATION_INSTRUCTIONS", "").strip()
+
+    pending = []   # (index, selected passages, cache key, truncation)
+
+    for i, article in enumerate(articles):
+        if not article or len(article) < MIN_ARTICLE_CHARS:
+            results[i] = dict(INSUFFICIENT_CONTENT_RESULT)
+            continue
+
+        article, truncation = select_passages(
+            article, driver, query, metric, EVAL_ARTICLE_TOKEN_BUDGET
+        )
+        cache_key = _cache_key(article, context, metric, driver, query, user_instruction)
+        cached = _cached_evaluation(cache_key)
+        if cached is not None:
+            results[i] = {**cached, "truncation": truncation}
+            continue
+
+        pending.append((i, article, cache_key, truncation))
+
+    for batch in _pack_batches(pending):
+        try:
+            evaluations, cost = _evaluate_batch(
+                [article for _, article, _, _ in batch],
+                context, metric, driver, query, user_instruction
+            )
+        except LLMUnavailable:
+            raise
+        except Exception as e:
+            print(f"Batch evaluation failed ({len(batch)} articles), falling back:", e)
+            if isinstance(e, ValueError):
+                metrics.LLM_PARSE_FAILURES.inc(purpose="evaluation_batch")
+            for i, _, _, _ in batch:
+                results[i] = evaluate_article(articles[i], context, metric, driver, query, prompts)
+            continue
+
+        for (i, _, cache_key, truncation), evaluation in zip(batch, evaluations):
+            eval_cache.put(cache_key, user_instruction, evaluation, cost / len(batch))
+            results[i] = {**evaluation, "truncation": truncation}
+
+    return results
+
+
+def _pack_batches(pending: list) -> list[list]:
+    batches = []
+    current, current_tokens = [], 0
+
+    for entry in pending:
+        tokens = estimate_tokens(entry[1])
+
+        if current and (
+            len(current) >= EVAL_BATCH_SIZE
+            or current_tokens + tokens > EVAL_BATCH_TOKEN_BUDGET
+        ):
+            batches.append(current)
+            current, current_tokens = [], 0
+
+        current.append(entry)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+
+def _evaluate_batch(
+    articles: list[str],
+    context: str,
+    metric: str,
+    driver: str,
+    query: str,
+    user_instruction: str
+) -> tuple[list[dict], float]:
+    """
+    One request for many articles. Raises if the response does not
+    contain exactly one well-formed entry per article.
+    """
+
+    article_blocks = "\n\n".join(
+        f"[ARTICLE {n}]\n\"\"\"\n{article}\n\"\"\""
+        for n, article in enumerate(articles, start=1)
+    )
+
+    tail = f"""
+Driver:
+{driver}
+
+Search Query:
+{query}
+
+Articles:
+{article_blocks}
+
+OUTPUT FORMAT (STRICT JSON ONLY, exactly {len(articles)} entries, same order as the articles):
+[
+  {{
+    "id": <article number>,
+    "score": <integer 1-5>,
+    "summary": "<short summary>"
+  }}
+]
+""".strip()
+
+    response = chat(_messages(context, metric, user_instruction, tail), "evaluation_batch")
+
+    items = _safe_json_parse_list(response.choices[0].message.content)
+
+    if len(items) != len(articles):
+        raise ValueError(f"expected {len(articles)} entries, got {len(items)}")
+
+    # Honor explicit ids when the model reorders entries
+    if all(isinstance(item, dict) and "id" in item for item in items):
+        items = sorted(items, key=lambda item: int(item["id"]))
+        if [int(item["id"]) for item in items] != list(range(1, len(articles) + 1)):
+            raise ValueError("Batch response ids do not match the articles")
+
+    evaluations = [_validate_evaluation(item) for item in items]
+    return evaluations, _cost_usd(response)
@@ -0,0 +1,122 @@
+# article_store.py
+import os
+import time
+from dotenv import load_dotenv
+
+from db import Counters, evict, get_store_connection
+from url_utils import canonicalize_url
+
+load_dotenv()
+
+ARTICLE_STORE_DB = os.getenv("ARTICLE_STORE_DB", "article_store.db")
+ARTICLE_STORE_MAX_AGE_DAYS = float(os.getenv("ARTICLE_STORE_MAX_AGE_DAYS", 14))
+ARTICLE_STORE_MAX_MB = float(os.getenv("ARTICLE_STORE_MAX_MB", 200))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    url           TEXT PRIMARY KEY,
+    text          TEXT NOT NULL,
+    etag          TEXT,
+    last_modified TEXT,
+    size          INTEGER NOT NULL,
+    fetched_at    REAL NOT NULL,
+    validated_at  REAL NOT NULL,
+    accessed_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_articles_accessed ON articles (accessed_at);
+CREATE INDEX IF NOT EXISTS idx_articles_validated ON articles (validated_at);
+"""
+
+_stats = Counters(lookups=0, stored=0, not_modified=0, evictions=0)
+
+
+def _conn():
+    return get_store_connection(ARTICLE_STORE_DB, _SCHEMA)
+
+
+def get(url: str):
+    """
+    Returns the stored entry for `url` as a dict
+    (text, etag, last_modified, fetched_at), or None.
+    """
+    _stats.add("lookups")
+
+    row = _conn().execute(
+        "SELECT text, etag, last_modified, fetched_at FROM articles WHERE url = ?",
+        (canonicalize_url(url),)
+    ).fetchone()
+
+    return dict(row) if row else None
+
+
+def conditional_headers(entry) -> dict:
+    """
+    Validators to turn a repeat fetch into a conditional GET.
+    """
+    headers = {}
+    if not entry:
+        return headers
+
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    return headers
+
+
+def mark_not_modified(url: str):
+    """
+    Records a 304 revalidation; the stored text is still current.
+    """
+    now = time.time()
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "UPDATE articles SET validated_at = ?, accessed_at = ? WHERE url = ?",
+            (now, now, canonicalize_url(url))
+        )
+    _stats.add("not_modified")
+
+
+def put(url: str, text: str, etag: str = None, last_modified: str = None):
+    now = time.time()
+    conn = _conn()
+
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO articles "
+            "(url, text, etag, last_modified, size, fetched_at, validated_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                canonicalize_url(url), text, etag, last_modified,
+                len(text.encode("utf-8")), now, now, now
+            )
+        )
+    _stats.add("stored")
+    _evict(conn)
+
+
+def _evict(conn):
+    """
+    Drops entries not (re)validated within ARTICLE_STORE_MAX_AGE_DAYS,
+    then least-recently-used ones until the store fits ARTICLE_STORE_MAX_MB.
+    """
+    removed = evict(
+        conn, "articles", "url", "validated_at",
+        ARTICLE_STORE_MAX_AGE_DAYS * 86400, int(ARTICLE_STORE_MAX_MB * 1024 * 1024)
+    )
+    if removed:
+        _stats.add("evictions", removed)
+
+
+def stats() -> dict:
+    snapshot = _stats.snapshot()
+
+    row = _conn().execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM articles"
+    ).fetchone()
+    snapshot["entries"] = row[0]
+    snapshot["bytes"] = row[1]
+
+    return snapshot
@@ -0,0 +1,666 @@
+# benchmark.py
+"""
+Offline end-to-end benchmark of the search pipeline.
+
+Starts local stand-ins for the Brave Search API, the OpenAI chat
+completions API and a set of publisher sites, points the app at them and
+runs real searches through POST /start-search. Nothing leaves the machine
+and no API credit is spent.
+
+    python benchmark.py --drivers 3 --runs 2 --llm-latency 0.8 --output bench.jsonl
+
+Every stand-in takes a latency (seconds, +/-50% jitter), an error rate
+(share of requests answered with a 503) and a rate limit (requests per
+second; excess requests get 429 + Retry-After, 0 = unlimited). The LLM
+stand-in can also enforce a tokens-per-minute limit (--llm-tpm-limit).
+Publisher pages come from the bundled benchmark_corpus (publisher-style
+page templates filled with a seeded pick of sample paragraphs), from
+--corpus (a directory of saved .html pages) or, with --generated-pages,
+from random filler text. Pipeline settings (FETCH_WINDOW, EVAL_WORKERS,
+EVAL_BATCH_SIZE, ...) are taken from the environment as usual.
+
+Each run reports per-stage wall time, articles/sec, p50/p95 latencies and
+peak RSS; --output appends the same numbers as one JSON line per run so
+results can be compared across commits.
+"""
+import argparse
+import html
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+from rate_limiter import TokenBucket
+
+TOPIC_WORDS = """
+hyperscale hyperscaler data center campus capex capacity expansion power cooling
+liquid immersion gpu accelerator ai cluster colocation megawatt gigawatt utility grid
+substation transformer switchgear ups battery generator procurement buildout
+construction semiconductor fab telecom fiber network edge modular rack density
+thermal chiller electricity demand investment guidance quarter revenue orders backlog
+""".split()
+
+FILLER_WORDS = """
+the company said on its in a to and of for with that this as by from at new year
+analysts expect plans announced report according while more than about also which
+its will has have been were after market growth percent billion million region
+""".split()
+
+DRIVER_NAMES = [
+    "Hyperscaler AI data center buildouts",
+    "Colocation campus expansion",
+    "Liquid cooling adoption for GPU clusters",
+    "Utility grid interconnection constraints",
+    "Semiconductor fab construction",
+    "Telecom edge network upgrades",
+    "Backup power procurement",
+    "Modular data center deployments",
+]
+
+# Brave results that point into this pool repeat across queries (dedup load)
+SHARED_PAGE_POOL = 50
+
+# Publisher-style page templates and sample paragraphs served by default
+SAMPLE_CORPUS = Path(__file__).parent / "benchmark_corpus"
+
+
+# --------------------------------------------------
+# Stand-in servers
+# --------------------------------------------------
+class _StandIn(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, handler, latency: float, error_rate: float, rate_limit: float, **extra):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate_limit) if rate_limit > 0 else None
+        self.extra = extra
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real services
+
+    def log_message(self, *args):
+        pass
+
+    def _admit(self) -> bool:
+        """
+        Applies the stand-in's rate limit, latency and error rate.
+        """
+        server = self.server
+        if server.bucket and not server.bucket.try_acquire():
+            self._send(429, b'{"error": "rate limited"}', "application/json", {"Retry-After": "1"})
+            return False
+
+        time.sleep(server.latency * random.uniform(0.5, 1.5))
+
+        if random.random() < server.error_rate:
+            self._send(503, b'{"error": "unavailable"}', "application/json")
+            return False
+        return True
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, payload):
+        self._send(200, json.dumps(payload).encode(), "application/json")
+
+
+class _BraveHandler(_Handler):
+    """GET /res/v1/web/search"""
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path != "/res/v1/web/search":
+            return self._send(404, b"{}", "application/json")
+        if not self._admit():
+            return
+
+        params = parse_qs(url.query)
+        query = params.get("q", [""])[0]
+        count = min(int(params.get("count", ["10"])[0]), self.server.extra["results_per_query"])
+        publishers = self.server.extra["publisher_ports"]
+        rng = random.Random(query)
+
+        results = []
+        for i in range(count):
+            if rng.random() < self.server.extra["dup_rate"]:
+                page_id = rng.randrange(SHARED_PAGE_POOL)
+            else:
+                page_id = SHARED_PAGE_POOL + zlib.crc32(f"{query}|{i}".encode())
+
+            page_rng = random.Random(page_id)
+            publisher = page_id % len(publishers)
+            published = datetime.now(timezone.utc) - timedelta(hours=page_rng.uniform(1, 24 * 30))
+            results.append({
+                "title": _sentence(page_rng, 8, 14),
+                "url": f"http://127.0.0.1:{publishers[publisher]}/article/{page_id}",
+                "description": _sentence(page_rng, 20, 40),
+                "meta_url": {"hostname": f"www.publisher{publisher}.example"},
+                "profile": {"name": f"Publisher {publisher}"},
+                "page_age": published.strftime("%Y-%m-%dT%H:%M:%S"),
+            })
+
+        self._send_json({"web": {"results": results}})
+
+
+class _LLMHandler(_Handler):
+    """POST /v1/chat/completions"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if urlsplit(self.path).path != "/v1/chat/completions":
+            return self._send(404, b"{}", "application/json")
+
+        tpm = self.server.extra["tpm_bucket"]
+        if tpm and not tpm.try_acquire(min(len(body) // 4 + 1, tpm.capacity)):
+            return self._send(429, b'{"error": "tokens per minute exceeded"}',
+                              "application/json", {"Retry-After": "2"})
+        if not self._admit():
+            return
+
+        request = json.loads(body or b"{}")
+        messages = request.get("messages", [])
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        last = str(messages[-1].get("content", "")) if messages else ""
+        rng = random.Random(zlib.crc32(last.encode()))
+
+        if "[ARTICLE " in last:
+            content = json.dumps([
+                {"id": n, "score": rng.randint(1, 5), "summary": _sentence(rng, 20, 40)}
+                for n in range(1, last.count("[ARTICLE ") + 1)
+            ])
+        elif "Article Content:" in last:
+            content = json.dumps({"score": rng.randint(1, 5), "summary": _sentence(rng, 20, 40)})
+        else:
+            driver = last.rsplit("Driver:", 1)[-1].strip().splitlines()[0]
+            rng = random.Random(driver)
+            content = json.dumps({
+                "queries": [
+                    f"{driver} " + " ".join(rng.sample(TOPIC_WORDS, 9)) + f" {n}"
+                    for n in range(12)
+                ]
+            })
+
+        prompt_tokens = len(prompt) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        self._send_json({
+            "id": f"chatcmpl-bench-{rng.getrandbits(32)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "benchmark"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+class _PublisherHandler(_Handler):
+    """GET /article/<id>"""
+
+    def do_GET(self):
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "article" or not parts[1].isdigit():
+            return self._send(404, b"not found", "text/plain")
+        if not self._admit():
+            return
+
+        page_id = int(parts[1])
+        etag = f'"{page_id}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        page = self.server.extra["page"](page_id)
+        self._send(200, page, "text/html; charset=utf-8", {"ETag": etag})
+
+
+def _sentence(rng: random.Random, min_words: int, max_words: int) -> str:
+    words = [
+        rng.choice(TOPIC_WORDS if rng.random() < 0.35 else FILLER_WORDS)
+        for _ in range(rng.randint(min_words, max_words))
+    ]
+    return " ".join(words).capitalize() + "."
+
+
+def _synthetic_page(page_id: int) -> bytes:
+    """
+    Article-shaped page: navigation, scripts and footer around the body.
+    """
+    rng = random.Random(page_id)
+    title = _sentence(rng, 8, 14)
+    paragraphs = "".join(
+        f"<p>{_sentence(rng, 25, 45)} {_sentence(rng, 25, 45)}</p>"
+        for _ in range(rng.randint(6, 24))
+    )
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<meta name="description" content="{_sentence(rng, 15, 25)}">
+<script>window.analytics = {{ page: {page_id} }};</script>
+<style>body {{ font-family: serif; }}</style></head>
+<body>
+<nav><a href="/">Home</a> <a href="/markets">Markets</a> <a href="/tech">Technology</a></nav>
+<header><h1>{title}</h1><p class="byline">By Staff Reporter</p></header>
+<article>{paragraphs}</article>
+<aside><h2>Related</h2><ul><li>{_sentence(rng, 6, 10)}</li><li>{_sentence(rng, 6, 10)}</li></ul></aside>
+<footer>Subscribe to our newsletter. Copyright Benchmark Media.</footer>
+</body></html>""".encode()
+
+
+def _template_page(templates: list[str], paragraphs: list[str], page_id: int) -> bytes:
+    """
+    One template from the bundled corpus with a seeded pick of paragraphs
+    as the story body. Titles come from the first paragraph.
+    """
+    rng = random.Random(page_id)
+    template = templates[page_id % len(templates)]
+    picked = rng.sample(paragraphs, min(len(paragraphs), rng.randint(4, 9)))
+
+    title = " ".join(picked[0].split(". ")[0].split()[:14]).rstrip(".,")
+    body = []
+    for i, paragraph in enumerate(picked):
+        if i and rng.random() < 0.15:
+            body.append(f"<h2>{html.escape(' '.join(paragraph.split()[:6]))}</h2>")
+        if i and rng.random() < 0.1:
+            body.append(f"<blockquote><p>{html.escape(paragraph)}</p></blockquote>")
+        else:
+            body.append(f"<p>{html.escape(paragraph)}</p>")
+
+    page = template.replace("<!-- TITLE -->", html.escape(title))
+    return page.replace("<!-- BODY -->", "\n".join(body)).encode()
+
+
+def _load_corpus(path: str):
+    """
+    Page builder for the publisher stand-in, plus a short description.
+
+    A directory with paragraphs.txt and templates/ (like benchmark_corpus)
+    fills the templates; any other directory is served as saved pages.
+    """
+    if not path:
+        return _synthetic_page, "generated"
+
+    root = Path(path)
+    if (root / "paragraphs.txt").exists():
+        templates = [
+            p.read_text(encoding="utf-8") for p in sorted((root / "templates").glob("*.htm*"))
+        ]
+        text = (root / "paragraphs.txt").read_text(encoding="utf-8")
+        paragraphs = [" ".join(p.split()) for p in text.split("\n\n") if p.strip()]
+        if not templates or not paragraphs:
+            raise SystemExit(f"{path} needs templates/*.html and paragraphs.txt")
+        return (
+            partial(_template_page, templates, paragraphs),
+            f"{len(templates)} templates, {len(paragraphs)} paragraphs",
+        )
+
+    pages = [p.read_bytes() for p in sorted(root.glob("**/*.htm*"))]
+    if not pages:
+        raise SystemExit(f"No .html files found under {path}")
+    return (lambda page_id: pages[page_id % len(pages)]), f"{len(pages)} saved pages"
+
+
+def _serve_stand_ins(config: dict, ready):
+    """
+    Child process: runs every stand-in until the benchmark terminates it.
+    """
+    page, corpus = _load_corpus(config["corpus"])
+
+    publishers = [
+        _StandIn(
+            _PublisherHandler,
+            config["publisher_latency"], config["publisher_error_rate"],
+            config["publisher_rate_limit"], page=page
+        )
+        for _ in range(config["publishers"])
+    ]
+    brave = _StandIn(
+        _BraveHandler,
+        config["brave_latency"], config["brave_error_rate"], config["brave_rate_limit"],
+        publisher_ports=[p.port for p in publishers],
+        results_per_query=config["results_per_query"],
+        dup_rate=config["dup_rate"]
+    )
+    llm = _StandIn(
+        _LLMHandler,
+        config["llm_latency"], config["llm_error_rate"], config["llm_rate_limit"],
+        tpm_bucket=(
+            TokenBucket(config["llm_tpm_limit"] / 60, config["llm_tpm_limit"])
+            if config["llm_tpm_limit"] > 0 else None
+        )
+    )
+
+    for server in [brave, llm, *publishers]:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    ready.put({
+        "brave": brave.port,
+        "llm": llm.port,
+        "publishers": [p.port for p in publishers],
+        "corpus": corpus,
+    })
+    threading.Event().wait()
+
+
+# --------------------------------------------------
+# Latency probes
+# --------------------------------------------------
+class _Probes:
+    """
+    Timing wrappers around the pipeline's outbound calls. They call
+    straight through; only durations are recorded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.samples = {"search": [], "fetch": [], "llm": [], "article": []}
+            self._searched_at = {}
+
+    def record(self, kind: str, seconds: float):
+        with self._lock:
+            self.samples[kind].append(seconds)
+
+    def install(self, modules: dict):
+        search_executor = modules["search_executor"]
+        fetcher = modules["fetcher"]
+        state = modules["state"]
+
+        search_brave = search_executor.search_brave
+
+        def timed_search(query, days, count=10):
+            start = time.monotonic()
+            results = search_brave(query, days, count)
+            now = time.monotonic()
+            self.record("search", now - start)
+            with self._lock:
+                for r in results:
+                    self._searched_at.setdefault(r.get("url"), now)
+            return results
+
+        search_executor.search_brave = timed_search
+
+        submit = fetcher.engine.submit
+
+        def timed_submit(url):
+            start = time.monotonic()
+            future = submit(url)
+            future.add_done_callback(lambda _: self.record("fetch", time.monotonic() - start))
+            return future
+
+        fetcher.engine.submit = timed_submit
+
+        add_result = state.Workspace.add_result
+
+        def timed_add_result(workspace, driver, query, result):
+            add_result(workspace, driver, query, result)
+            with self._lock:
+                searched_at = self._searched_at.get(result.get("url"))
+            if searched_at is not None:
+                # Search result in hand -> evaluation stored
+                self.record("article", time.monotonic() - searched_at)
+
+        state.Workspace.add_result = timed_add_result
+
+        completions = modules["llm_client"].chat.completions
+        create = completions.create
+
+        def timed_create(*args, **kwargs):
+            start = time.monotonic()
+            try:
+                return create(*args, **kwargs)
+            finally:
+                self.record("llm", time.monotonic() - start)
+
+        completions.create = timed_create
+
+
+def _percentile(values: list[float], pct: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+# --------------------------------------------------
+# Runs
+# --------------------------------------------------
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark")
+    parser.add_argument("--drivers", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=1,
+                        help="back-to-back runs; later runs see warm caches")
+    parser.add_argument("--mode", default="full", choices=["full", "incremental"])
+    parser.add_argument("--timeout", type=float, default=900, help="seconds per run")
+    parser.add_argument("--output", help="append one JSON line per run to this file")
+
+    parser.add_argument("--corpus", default=str(SAMPLE_CORPUS),
+                        help="directory of saved .html pages to serve (default: bundled sample)")
+    parser.add_argument("--generated-pages", action="store_const", dest="corpus", const="",
+                        help="serve random filler pages instead of a corpus")
+    parser.add_argument("--publishers", type=int, default=20, help="distinct publisher hosts")
+    parser.add_argument("--results-per-query", type=int, default=10)
+    parser.add_argument("--dup-rate", type=float, default=0.1,
+                        help="share of search results pointing at pages shared across queries")
+
+    for name, latency, rate_limit in (
+        ("brave", 0.3, 20),
+        ("llm", 0.8, 50),
+        ("publisher", 0.2, 0),
+    ):
+        parser.add_argument(f"--{name}-latency", type=float, default=latency)
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0)
+        parser.add_argument(f"--{name}-rate-limit", type=float, default=rate_limit)
+
+    parser.add_argument("--llm-tpm-limit", type=float, default=0,
+                        help="tokens per minute the LLM stand-in accepts (0 = unlimited)")
+
+    return parser.parse_args()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_once(client, args, probes: _Probes, run: int) -> dict:
+    probes.reset()
+    started = time.monotonic()
+
+    response = client.post("/start-search", query_string={"mode": args.mode})
+    body = response.get_json()
+    if "job_id" not in body:
+        raise SystemExit(f"Could not start search: {body}")
+    job_id = body["job_id"]
+
+    while True:
+        job = client.get(f"/jobs/{job_id}").get_json()
+        if job["status"] not in ("queued", "running"):
+            break
+        if time.monotonic() - started > args.timeout:
+            client.post(f"/jobs/{job_id}/cancel")
+        time.sleep(0.2)
+
+    wall = time.monotonic() - started
+    progress = job["progress"]
+
+    stages = {}
+    timings = sorted(job["stage_timings"].items(), key=lambda kv: kv[1]["started_at"] or 0)
+    for stage, timing in timings:
+        if timing["started_at"] and timing["finished_at"]:
+            stages[stage] = round(timing["finished_at"] - timing["started_at"], 3)
+
+    return {
+        "run": run,
+        "timestamp": time.time(),
+        "commit": _git_commit(),
+        "status": job["status"],
+        "wall_seconds": round(wall, 3),
+        "stages": stages,
+        "articles_fetched": progress.get("articles_fetched", 0),
+        "articles_evaluated": progress.get("articles_evaluated", 0),
+        "articles_per_second": round(progress.get("articles_evaluated", 0) / wall, 2),
+        "latency_ms": {
+            kind: {
+                "count": len(values),
+                "p50": _ms(_percentile(values, 50)),
+                "p95": _ms(_percentile(values, 95)),
+            }
+            for kind, values in probes.samples.items()
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+        "progress": progress,
+        "config": vars(args),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _print_report(report: dict):
+    print(f"\nrun {report['run']}: {report['status']} in {report['wall_seconds']:.2f}s "
+          f"(commit {report['commit'] or 'unknown'})")
+
+    print(f"  {'stage':<20}{'seconds':>10}")
+    for stage, seconds in report["stages"].items():
+        print(f"  {stage:<20}{seconds:>10.2f}")
+
+    print(f"  articles/sec        {report['articles_per_second']:>10.2f}  "
+          f"({report['articles_evaluated']} evaluated, {report['articles_fetched']} fetched)")
+
+    print(f"  {'latency ms':<20}{'count':>10}{'p50':>10}{'p95':>10}")
+    for kind, stats in report["latency_ms"].items():
+        p50 = "-" if stats["p50"] is None else f"{stats['p50']:.0f}"
+        p95 = "-" if stats["p95"] is None else f"{stats['p95']:.0f}"
+        print(f"  {kind:<20}{stats['count']:>10}{p50:>10}{p95:>10}")
+
+    print(f"  peak RSS            {report['peak_rss_mb']:>10.1f} MB")
+
+
+def main():
+    args = _parse_args()
+
+    ready = multiprocessing.Queue()
+    stand_ins = multiprocessing.Process(
+        target=_serve_stand_ins, args=(vars(args), ready), daemon=True
+    )
+    stand_ins.start()
+    ports = ready.get(timeout=30)
+
+    workdir = tempfile.mkdtemp(prefix="pipeline-bench-")
+    os.environ.update({
+        "BRAVE_API_KEY": "benchmark",
+        "BRAVE_ENDPOINT": f"http://127.0.0.1:{ports['brave']}/res/v1/web/search",
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{ports['llm']}/v1",
+        "STATE_DB": os.path.join(workdir, "state.db"),
+        "WORKSPACES_DIR": os.path.join(workdir, "workspaces"),
+        "SEARCH_CACHE_DB": os.path.join(workdir, "search_cache.db"),
+        "ARTICLE_STORE_DB": os.path.join(workdir, "article_store.db"),
+        "EVAL_CACHE_DB": os.path.join(workdir, "eval_cache.db"),
+    })
+    if args.brave_rate_limit:
+        os.environ.setdefault("BRAVE_QPS", str(args.brave_rate_limit))
+    # Gateway budget just under the stand-in's limit, as in production
+    os.environ.setdefault("LLM_TPM_BUDGET", str(int(args.llm_tpm_limit * 0.9)))
+
+    # Imported only now: these modules read their settings at import time
+    import app
+    import fetcher
+    import llm
+    import search_executor
+    import state
+
+    probes = _Probes()
+    probes.install({
+        "search_executor": search_executor,
+        "fetcher": fetcher,
+        "state": state,
+        "llm_client": llm.client,
+    })
+
+    drivers = []
+    for i in range(args.drivers):
+        name = DRIVER_NAMES[i % len(DRIVER_NAMES)]
+        drivers.append(name if i < len(DRIVER_NAMES) else f"{name} {i // len(DRIVER_NAMES) + 1}")
+
+    workspace = state.get_workspace()
+    with workspace.lock:
+        workspace.data["context"] = "Global data center infrastructure demand"
+        workspace.data["metric"] = "Revenue growth of power and cooling equipment suppliers"
+        workspace.data["drivers"] = drivers
+        workspace.save()
+
+    print(f"Stand-ins: brave :{ports['brave']}, llm :{ports['llm']}, "
+          f"{len(ports['publishers'])} publishers"
+          f" ({ports['corpus']})")
+
+    client = app.app.test_client()
+    try:
+        for run in range(1, args.runs + 1):
+            report = _run_once(client, args, probes, run)
+            _print_report(report)
+
+            if args.output:
+                with open(args.output, "a") as f:
+                    f.write(json.dumps(report) + "\n")
+    finally:
+        fetcher.engine.close()
+        stand_ins.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
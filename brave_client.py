@@ -1,30 +1,101 @@
 # brave_client.py
 import os
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+import metrics
+import search_cache
+from rate_limiter import TokenBucket, backoff_delay
+
 load_dotenv()
 
 BRAVE_API_KEY = os.getenv("BRAVE_API_KEY")
-BRAVE_ENDPOINT = "https://api.search.brave.com/res/v1/web/search"
+BRAVE_ENDPOINT = os.getenv("BRAVE_ENDPOINT", "https://api.search.brave.com/res/v1/web/search")
+
+# Match these to the Brave subscription plan
+BRAVE_QPS = float(os.getenv("BRAVE_QPS", 1))
+BRAVE_CONCURRENCY = int(os.getenv("BRAVE_CONCURRENCY", 4))
+BRAVE_MAX_RETRIES = int(os.getenv("BRAVE_MAX_RETRIES", 3))
+BRAVE_BACKOFF_SECONDS = 1.0
+BRAVE_BACKOFF_CAP_SECONDS = 30.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
 if not BRAVE_API_KEY:
     raise RuntimeError("BRAVE_API_KEY missing in .env")
 
 
+# --------------------------------------------------
+# Shared keep-alive session + rate limiter
+# --------------------------------------------------
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=BRAVE_CONCURRENCY
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Accept": "application/json",
+        "X-Subscription-Token": BRAVE_API_KEY
+    })
+    return session
+
+
+_session = _build_session()
+_limiter = TokenBucket(rate=BRAVE_QPS, capacity=1)
+
+
 def _build_freshness(days: int) -> str:
     end = datetime.utcnow().date()
     start = end - timedelta(days=days)
     return f"{start}to{end}"
 
 
-def search_brave(query: str, days: int, count: int = 10) -> list[dict]:
-    headers = {
-        "Accept": "application/json",
-        "X-Subscription-Token": BRAVE_API_KEY
-    }
+def _source_name(item: dict):
+    """
+    Publisher host ("bbc.com"), falling back to Brave's site profile name.
+    """
+    hostname = (item.get("meta_url") or {}).get("hostname")
+    if hostname:
+        return hostname.lower().removeprefix("www.")
+    return (item.get("profile") or {}).get("name")
+
+
+def _get_with_retries(params: dict) -> requests.Response:
+    for attempt in range(BRAVE_MAX_RETRIES + 1):
+        _limiter.acquire()
+
+        try:
+            with metrics.BRAVE_REQUEST_SECONDS.time():
+                response = _session.get(BRAVE_ENDPOINT, params=params, timeout=20)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.BRAVE_REQUESTS.inc(status="error")
+            if attempt == BRAVE_MAX_RETRIES:
+                raise
+            print(f"Brave request error (attempt {attempt + 1}):", e)
+            time.sleep(backoff_delay(attempt, BRAVE_BACKOFF_SECONDS, BRAVE_BACKOFF_CAP_SECONDS))
+            continue
 
+        metrics.BRAVE_REQUESTS.inc(status=response.status_code)
+
+        if response.status_code in RETRY_STATUSES and attempt < BRAVE_MAX_RETRIES:
+            if response.status_code == 429:
+                _limiter.drain()
+            time.sleep(backoff_delay(
+                attempt, BRAVE_BACKOFF_SECONDS, BRAVE_BACKOFF_CAP_SECONDS, response
+            ))
+            continue
+
+        response.raise_for_status()
+        return response
+
+
+def search_brave(query: str, days: int, count: int = 10) -> list[dict]:
     params = {
         "q": query,
         "count": count,
@@ -33,14 +104,17 @@ def search_brave(query: str, days: int, count: int = 10) -> list[dict]:
         "freshness": _build_freshness(days)
     }
 
-    response = requests.get(
-        BRAVE_ENDPOINT,
-        headers=headers,
-        params=params,
-        timeout=20
+    # Warm reruns (same query + window) never touch the network
+    cache_key = search_cache.make_key(
+        query, count, params["search_lang"], params["freshness"]
     )
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        metrics.BRAVE_SEARCHES.inc(source="cache")
+        return cached
 
-    response.raise_for_status()
+    metrics.BRAVE_SEARCHES.inc(source="live")
+    response = _get_with_retries(params)
     data = response.json()
 
     results = []
@@ -50,8 +124,9 @@ def search_brave(query: str, days: int, count: int = 10) -> list[dict]:
             "title": item.get("title"),
             "url": item.get("url"),
             "description": item.get("description"),
-            "source": item.get("source"),
-            "published": item.get("published")
+            "source": _source_name(item),
+            "published": item.get("page_age")  # ISO 8601, e.g. 2025-05-10T14:02:11
         })
 
+    search_cache.put(cache_key, query, results)
     return results
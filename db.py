@@ -0,0 +1,103 @@
+# db.py
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+_local = threading.local()
+
+
+def get_connection(path) -> sqlite3.Connection:
+    """
+    One SQLite connection per (thread, database file).
+    WAL mode lets readers proceed while a writer commits.
+    """
+    path = str(Path(path))
+    connections = getattr(_local, "connections", None)
+
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(path)
+    if conn is None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        connections[path] = conn
+
+    return conn
+
+
+# --------------------------------------------------
+# Helpers shared by the cache / store modules
+# --------------------------------------------------
+_schema_ready = set()
+
+
+def get_store_connection(path, schema: str) -> sqlite3.Connection:
+    """
+    `get_connection`, running `schema` (CREATE ... IF NOT EXISTS) the
+    first time the file is opened in this process.
+    """
+    conn = get_connection(path)
+    key = str(Path(path))
+    if key not in _schema_ready:
+        conn.executescript(schema)
+        _schema_ready.add(key)
+    return conn
+
+
+class Counters:
+    """
+    Thread-safe in-process counters behind a store's stats().
+    """
+
+    def __init__(self, **initial):
+        self._values = dict(initial)
+        self._lock = threading.Lock()
+
+    def add(self, key: str, amount=1):
+        with self._lock:
+            self._values[key] += amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+
+def evict(conn, table: str, key_column: str, age_column: str,
+          max_age_seconds: float, max_bytes: int) -> int:
+    """
+    Drops rows whose `age_column` is older than `max_age_seconds`, then
+    least-recently-used ones (by `accessed_at`) until SUM(size) fits in
+    `max_bytes`. Returns the number of rows removed.
+    """
+    cutoff = time.time() - max_age_seconds
+
+    with conn:
+        expired = conn.execute(
+            f"DELETE FROM {table} WHERE {age_column} < ?",
+            (cutoff,)
+        ).rowcount
+
+        total = conn.execute(
+            f"SELECT COALESCE(SUM(size), 0) FROM {table}"
+        ).fetchone()[0]
+
+        stale = []
+        if total > max_bytes:
+            rows = conn.execute(
+                f"SELECT {key_column}, size FROM {table} ORDER BY accessed_at ASC"
+            ).fetchall()
+
+            for row in rows:
+                if total <= max_bytes:
+                    break
+                stale.append((row[key_column],))
+                total -= row["size"]
+
+            conn.executemany(f"DELETE FROM {table} WHERE {key_column} = ?", stale)
+
+    return expired + len(stale)
@@ -1,5 +1,29 @@
 # deduplicator.py
+import os
+import threading
 from simhash import Simhash
+from dotenv import load_dotenv
+
+from url_utils import canonicalize_url
+from normalizer import normalize_query
+from relevance import tokenize
+
+load_dotenv()
+
+FINGERPRINT_BITS = 64
+
+# "driver": an article may appear once per driver (default)
+# "global": an article appears once per run, under the first driver that found it
+DEDUP_SCOPE = os.getenv("DEDUP_SCOPE", "driver")
+
+# Queries whose normalized token sets overlap at least this much (Jaccard)
+# share one search; 1.0 merges only queries with identical token sets
+QUERY_CLUSTER_THRESHOLD = float(os.getenv("QUERY_CLUSTER_THRESHOLD", 0.75))
+
+# Article bodies shorter than this are too thin to fingerprint reliably
+BODY_MIN_WORDS = 80
+BODY_MAX_CHARS = 20000
+BODY_SHINGLE_SIZE = 3
 
 
 def _text_fingerprint(item: dict) -> int:
@@ -11,13 +35,230 @@ def _text_fingerprint(item: dict) -> int:
     return Simhash(tokens).value
 
 
+def _body_fingerprint(words: list[str]) -> int:
+    """
+    SimHash over word shingles of the extracted article body.
+    """
+    shingles = [
+        " ".join(words[i:i + BODY_SHINGLE_SIZE])
+        for i in range(len(words) - BODY_SHINGLE_SIZE + 1)
+    ]
+    return Simhash(shingles).value
+
+
+class SimhashIndex:
+    """
+    Banded index over 64-bit SimHash fingerprints.
+
+    The fingerprint is split into `max_distance + 1` bands. Two fingerprints
+    within Hamming distance `max_distance` differ in at most that many bits,
+    so (pigeonhole) they agree exactly on at least one band. A lookup only
+    compares against fingerprints sharing a band, using raw integer XOR.
+    """
+
+    def __init__(self, max_distance: int = 5, bits: int = FINGERPRINT_BITS):
+        self.max_distance = max_distance
+        self._bands = []   # (shift, mask) per band
+        self._tables = []  # band value -> [fingerprints]
+
+        band_count = max_distance + 1
+        base, extra = divmod(bits, band_count)
+        shift = 0
+
+        for i in range(band_count):
+            width = base + (1 if i < extra else 0)
+            self._bands.append((shift, (1 << width) - 1))
+            self._tables.append({})
+            shift += width
+
+    def find_near(self, fingerprint: int):
+        """
+        Returns an indexed fingerprint within `max_distance`, or None.
+        """
+        for (shift, mask), table in zip(self._bands, self._tables):
+            for candidate in table.get((fingerprint >> shift) & mask, ()):
+                if (candidate ^ fingerprint).bit_count() <= self.max_distance:
+                    return candidate
+        return None
+
+    def add(self, fingerprint: int):
+        for (shift, mask), table in zip(self._bands, self._tables):
+            table.setdefault((fingerprint >> shift) & mask, []).append(fingerprint)
+
+
+class IncrementalDeduplicator:
+    """
+    Streaming version of `deduplicate_search_results`.
+    Results are fed one at a time as searches complete:
+    1. Exact match on the canonical URL
+    2. Near-duplicate content using SimHash
+
+    `scope` is "driver" (dedup within each driver) or "global" (across drivers).
+    """
+
+    def __init__(self, simhash_threshold: int = 5, scope: str = None):
+        self.simhash_threshold = simhash_threshold
+        self.scope = scope or DEDUP_SCOPE
+
+        if self.scope not in ("driver", "global"):
+            raise ValueError(f"Unknown dedup scope: {self.scope}")
+
+        self._seen_urls = {}
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def accept(self, driver: str, item: dict) -> bool:
+        """
+        Returns True if `item` is new within its scope (and remembers it).
+        """
+        url = canonicalize_url(item.get("url"))
+        if not url:
+            return False
+
+        bucket = driver if self.scope == "driver" else None
+
+        with self._lock:
+            seen_urls = self._seen_urls.setdefault(bucket, set())
+            index = self._indexes.get(bucket)
+            if index is None:
+                index = self._indexes[bucket] = SimhashIndex(self.simhash_threshold)
+
+            # ---- STEP 1: canonical URL dedup ----
+            if url in seen_urls:
+                return False
+            seen_urls.add(url)
+
+            # ---- STEP 2: SimHash dedup ----
+            fingerprint = _text_fingerprint(item)
+
+            if index.find_near(fingerprint) is not None:
+                return False
+
+            index.add(fingerprint)
+            return True
+
+
+class BodyDeduplicator:
+    """
+    Post-fetch duplicate detection on the extracted article text.
+    Catches wire stories syndicated across outlets and AMP/mobile copies
+    whose search titles/descriptions differ.
+
+    Every distinct body owns one shared `sources` list; duplicates are
+    appended to it instead of being evaluated again.
+    """
+
+    def __init__(self, simhash_threshold: int = 3, scope: str = None):
+        self.simhash_threshold = simhash_threshold
+        self.scope = scope or DEDUP_SCOPE
+
+        if self.scope not in ("driver", "global"):
+            raise ValueError(f"Unknown dedup scope: {self.scope}")
+
+        self._indexes = {}
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def register(self, driver: str, text: str, source: dict) -> tuple[bool, list, str]:
+        """
+        Returns (is_duplicate, sources, owner). `sources` is the shared list
+        for this body, already containing `source`; `owner` is the driver
+        the first copy was registered under.
+        """
+        words = text[:BODY_MAX_CHARS].lower().split()
+        if len(words) < BODY_MIN_WORDS:
+            return False, [source], driver
+
+        fingerprint = _body_fingerprint(words)
+        bucket = driver if self.scope == "driver" else None
+
+        with self._lock:
+            index = self._indexes.get(bucket)
+            if index is None:
+                index = self._indexes[bucket] = SimhashIndex(self.simhash_threshold)
+
+            match = index.find_near(fingerprint)
+            if match is not None:
+                owner, sources = self._sources[(bucket, match)]
+                sources.append(source)
+                return True, sources, owner
+
+            index.add(fingerprint)
+            sources = [source]
+            self._sources[(bucket, fingerprint)] = (driver, sources)
+            return False, sources, driver
+
+
+class QueryCluster:
+    """
+    Near-identical queries (from any driver) answered by one search of
+    `query`, the first member's text. `members` are (driver, query) pairs.
+    """
+
+    def __init__(self, driver: str, query: str, tokens: frozenset):
+        self.driver = driver
+        self.query = query
+        self.tokens = tokens
+        self.members = [(driver, query)]
+        self.results = None
+        self.done = False
+
+
+class QueryClusterer:
+    """
+    Groups queries across all drivers by token-set similarity of their
+    normalized form, so near-duplicates cost one search.
+
+    `join` returns the query's cluster and whether the caller must
+    search it ("search"), will be served when that search completes
+    ("joined"), or arrived after it completed and should reuse
+    `cluster.results` itself ("late").
+    """
+
+    def __init__(self, threshold: float = None):
+        self.threshold = QUERY_CLUSTER_THRESHOLD if threshold is None else threshold
+        self._clusters = []
+        self._lock = threading.Lock()
+
+    def join(self, driver: str, query: str) -> tuple[QueryCluster, str]:
+        tokens = frozenset(tokenize(normalize_query(query)))
+
+        with self._lock:
+            for cluster in self._clusters:
+                if _jaccard(tokens, cluster.tokens) >= self.threshold:
+                    if cluster.done:
+                        return cluster, "late"
+                    cluster.members.append((driver, query))
+                    return cluster, "joined"
+
+            cluster = QueryCluster(driver, query, tokens)
+            self._clusters.append(cluster)
+            return cluster, "search"
+
+    def complete(self, cluster: QueryCluster, results: list[dict]) -> list[tuple[str, str]]:
+        """
+        Stores the cluster's results; returns every member joined so far.
+        """
+        with self._lock:
+            cluster.results = results
+            cluster.done = True
+            return list(cluster.members)
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    return len(a & b) / len(a | b)
+
+
 def deduplicate_search_results(
     search_results: dict,
-    simhash_threshold: int = 5
+    simhash_threshold: int = 5,
+    scope: str = None
 ) -> dict:
     """
     Deduplicates search results by:
-    1. Exact URL match
+    1. Exact match on the canonical URL
     2. Near-duplicate content using SimHash
 
     search_results structure:
@@ -28,46 +269,17 @@ def deduplicate_search_results(
     }
     """
 
+    dedup = IncrementalDeduplicator(simhash_threshold, scope)
     deduped = {}
 
     for driver, queries in search_results.items():
-        seen_urls = set()
-        seen_hashes = []
-
         driver_cleaned = {}
 
         for query, results in queries.items():
-            unique_results = []
-
-            for item in results:
-                url = item.get("url")
-                if not url:
-                    continue
-
-                # ---- STEP 1: URL dedup ----
-                if url in seen_urls:
-                    continue
-                seen_urls.add(url)
-
-                # ---- STEP 2: SimHash dedup ----
-                fingerprint = _text_fingerprint(item)
-
-                is_duplicate = False
-                for existing in seen_hashes:
-                    if Simhash.distance(
-                        Simhash(fingerprint),
-                        Simhash(existing)
-                    ) <= simhash_threshold:
-                        is_duplicate = True
-                        break
-
-                if is_duplicate:
-                    continue
-
-                seen_hashes.append(fingerprint)
-                unique_results.append(item)
-
-            driver_cleaned[query] = unique_results
+            driver_cleaned[query] = [
+                item for item in results
+                if dedup.accept(driver, item)
+            ]
 
         deduped[driver] = driver_cleaned
 
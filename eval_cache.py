@@ -0,0 +1,139 @@
+# eval_cache.py
+import hashlib
+import json
+import os
+import time
+from dotenv import load_dotenv
+
+from db import Counters, get_store_connection
+
+load_dotenv()
+
+EVAL_CACHE_DB = os.getenv("EVAL_CACHE_DB", "eval_cache.db")
+EVAL_CACHE_ENABLED = os.getenv("EVAL_CACHE_ENABLED", "1") == "1"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS evaluations (
+    key         TEXT PRIMARY KEY,
+    prompt_hash TEXT NOT NULL,
+    score       INTEGER NOT NULL,
+    summary     TEXT NOT NULL,
+    cost_usd    REAL NOT NULL DEFAULT 0,
+    hit_count   INTEGER NOT NULL DEFAULT 0,
+    created_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_evaluations_prompt ON evaluations (prompt_hash);
+"""
+
+_stats = Counters(hits=0, misses=0, dollars_saved=0.0, invalidated=0)
+
+
+def _conn():
+    return get_store_connection(EVAL_CACHE_DB, _SCHEMA)
+
+
+def _sha256(value) -> str:
+    raw = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def prompt_hash(instructions: str) -> str:
+    """
+    Identifies one version of ARTICLE_EVALUATION_INSTRUCTIONS.
+    """
+    return _sha256(instructions or "")
+
+
+def make_key(article: str, context: str, metric: str, driver: str,
+             query: str, instructions: str, model: str) -> str:
+    """
+    `article` must already be truncated exactly as sent to the model.
+    """
+    return _sha256({
+        "article": article,
+        "context": context,
+        "metric": metric,
+        "driver": driver,
+        "query": query,
+        "prompt": prompt_hash(instructions),
+        "model": model,
+    })
+
+
+def get(key: str):
+    """
+    Returns the stored {score, summary}, or None.
+    """
+    if not EVAL_CACHE_ENABLED:
+        return None
+
+    conn = _conn()
+    row = conn.execute(
+        "SELECT score, summary, cost_usd FROM evaluations WHERE key = ?",
+        (key,)
+    ).fetchone()
+
+    if row is None:
+        _stats.add("misses")
+        return None
+
+    with conn:
+        conn.execute(
+            "UPDATE evaluations SET hit_count = hit_count + 1 WHERE key = ?",
+            (key,)
+        )
+
+    _stats.add("hits")
+    _stats.add("dollars_saved", row["cost_usd"])
+
+    return {"score": row["score"], "summary": row["summary"]}
+
+
+def put(key: str, instructions: str, evaluation: dict, cost_usd: float = 0.0):
+    if not EVAL_CACHE_ENABLED:
+        return
+
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO evaluations "
+            "(key, prompt_hash, score, summary, cost_usd, hit_count, created_at) "
+            "VALUES (?, ?, ?, ?, ?, 0, ?)",
+            (
+                key, prompt_hash(instructions),
+                evaluation["score"], evaluation["summary"],
+                cost_usd, time.time()
+            )
+        )
+
+
+def invalidate_prompt(old_instructions: str) -> int:
+    """
+    Drops only the evaluations produced under `old_instructions`.
+    """
+    conn = _conn()
+    with conn:
+        removed = conn.execute(
+            "DELETE FROM evaluations WHERE prompt_hash = ?",
+            (prompt_hash(old_instructions),)
+        ).rowcount
+
+    _stats.add("invalidated", removed)
+
+    return removed
+
+
+def stats() -> dict:
+    snapshot = _stats.snapshot()
+
+    lookups = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_rate"] = round(snapshot["hits"] / lookups, 3) if lookups else 0.0
+    snapshot["dollars_saved"] = round(snapshot["dollars_saved"], 4)
+
+    row = _conn().execute(
+        "SELECT COUNT(*), COALESCE(SUM(hit_count * cost_usd), 0) FROM evaluations"
+    ).fetchone()
+    snapshot["entries"] = row[0]
+    snapshot["lifetime_dollars_saved"] = round(row[1], 4)
+
+    return snapshot
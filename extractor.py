@@ -0,0 +1,120 @@
+# extractor.py
+import codecs
+import re
+import lxml.html
+from lxml import etree
+from readability import Document
+
+import metrics
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+_CHARSET_RE = re.compile(r"charset=[\"']?([\w\-]+)", re.IGNORECASE)
+
+
+def extract_text(body: bytes, encoding: str = None) -> str:
+    """
+    Parses the page once into an lxml tree; every strategy reuses it.
+    """
+    tree = _parse_html(body, encoding)
+    if tree is None:
+        metrics.EXTRACTIONS.inc(path="unparseable")
+        return ""
+
+    # ---------- Attempt 1: Readability ----------
+    try:
+        # Readability works on its own cleaned copy of the tree
+        content_html = Document(tree).summary(html_partial=True)
+        text = _element_text(lxml.html.fragment_fromstring(content_html, create_parent="div"))
+        if _is_valid(text):
+            metrics.EXTRACTIONS.inc(path="readability")
+            return text
+    except Exception:
+        pass
+
+    # ---------- Attempt 2: Paragraphs ----------
+    # Remove scripts/styles
+    for tag in tree.xpath("//script | //style | //noscript"):
+        tag.drop_tree()
+
+    paragraphs = [
+        " ".join(s.strip() for s in p.itertext() if s.strip())
+        for p in tree.iter("p")
+    ]
+
+    text = "\n".join(p for p in paragraphs if p)
+    if _is_valid(text):
+        metrics.EXTRACTIONS.inc(path="paragraphs")
+        return text
+
+    # ---------- Attempt 3: Meta description ----------
+    desc = tree.xpath('//meta[@name="description"]/@content')
+    if desc and desc[0].strip():
+        metrics.EXTRACTIONS.inc(path="meta_description")
+        return desc[0].strip()
+
+    metrics.EXTRACTIONS.inc(path="none")
+    return ""
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def is_html(content_type: str) -> bool:
+    # Servers that omit the header get the benefit of the doubt
+    if not content_type:
+        return True
+    return content_type.split(";")[0].strip().lower() in HTML_CONTENT_TYPES
+
+
+def charset_from_content_type(content_type: str):
+    match = _CHARSET_RE.search(content_type or "")
+    return match.group(1) if match else None
+
+
+def _parse_html(body: bytes, encoding: str = None):
+    if encoding and not _known_encoding(encoding):
+        encoding = None
+
+    if not encoding and _is_utf8(body):
+        # libxml2 would otherwise assume latin-1 when there is no meta charset
+        encoding = "utf-8"
+
+    parser = lxml.html.HTMLParser(encoding=encoding) if encoding else None
+
+    try:
+        return lxml.html.document_fromstring(body, parser=parser)
+    except (etree.ParserError, ValueError):
+        return None
+
+
+def _known_encoding(encoding: str) -> bool:
+    try:
+        codecs.lookup(encoding)
+        return True
+    except LookupError:
+        return False
+
+
+def _is_utf8(body: bytes) -> bool:
+    try:
+        body.decode("utf-8")
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def _element_text(element) -> str:
+    return "\n".join(
+        s.strip() for s in element.itertext() if s.strip()
+    )
+
+
+def _is_valid(text: str) -> bool:
+    if not text:
+        return False
+
+    text = re.sub(r"\s+", " ", text).strip()
+
+    # Require minimum content
+    return len(text) > 500
@@ -1,8 +1,15 @@
-import requests
-from bs4 import BeautifulSoup
-from readability import Document
-import re
-import time
+import asyncio
+import atexit
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import aiohttp
+
+import article_store
+import metrics
+from extractor import extract_text, is_html, charset_from_content_type
 
 HEADERS = {
     "User-Agent": (
@@ -11,72 +18,231 @@ HEADERS = {
         "Chrome/120.0.0.0 Safari/537.36"
     ),
     "Accept-Language": "en-US,en;q=0.9",
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.1",
 }
 
-
-def fetch_article(url: str, timeout=10) -> str:
-    if not url:
-        return ""
-
-    try:
-        resp = requests.get(url, headers=HEADERS, timeout=timeout)
-        if resp.status_code != 200:
+# Pages larger than this are not articles worth downloading
+MAX_HTML_BYTES = int(os.getenv("FETCH_MAX_HTML_BYTES", 3 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+
+# Downloads in flight overall / per publisher, and spacing between
+# request starts to the same publisher
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", 200))
+FETCH_PER_HOST_CONCURRENCY = int(os.getenv("FETCH_PER_HOST_CONCURRENCY", 2))
+FETCH_HOST_DELAY_SECONDS = float(os.getenv("FETCH_HOST_DELAY_SECONDS", 0.5))
+FETCH_TIMEOUT_SECONDS = float(os.getenv("FETCH_TIMEOUT_SECONDS", 20))
+FETCH_CONNECT_TIMEOUT_SECONDS = 10
+
+# HTML -> text is CPU work; keep it off the event loop
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", os.cpu_count() or 2))
+
+
+class AsyncFetchEngine:
+    """
+    asyncio article downloader running on its own event loop thread.
+
+    - one pooled aiohttp session for every download
+    - per-host concurrency cap and politeness delay
+    - total timeout per download, size cap, HTML-only
+    - conditional GETs against `article_store`
+
+    Thread-safe entry points: `submit(url)` -> concurrent Future, `fetch(url)` -> str.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._session = None
+        self._extract_pool = None
+        self._start_lock = threading.Lock()
+
+        # Only touched from the loop thread
+        self._host_slots = {}
+        self._host_locks = {}
+        self._host_next_start = {}
+
+    # ---------- lifecycle ----------
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever,
+                name="fetch-engine",
+                daemon=True
+            ).start()
+
+            self._extract_pool = ThreadPoolExecutor(
+                max_workers=EXTRACT_WORKERS,
+                thread_name_prefix="extract"
+            )
+            asyncio.run_coroutine_threadsafe(self._open_session(), loop).result()
+            self._loop = loop
+
+    async def _open_session(self):
+        self._session = aiohttp.ClientSession(
+            headers=HEADERS,
+            connector=aiohttp.TCPConnector(
+                limit=FETCH_CONCURRENCY,
+                limit_per_host=FETCH_PER_HOST_CONCURRENCY,
+                ttl_dns_cache=300
+            ),
+            timeout=aiohttp.ClientTimeout(
+                total=FETCH_TIMEOUT_SECONDS,
+                connect=FETCH_CONNECT_TIMEOUT_SECONDS
+            )
+        )
+
+    def close(self):
+        with self._start_lock:
+            if self._loop is None:
+                return
+
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._extract_pool.shutdown(wait=False)
+            self._loop = None
+
+    # ---------- public API ----------
+    def submit(self, url: str):
+        """
+        Schedules a download; returns a concurrent.futures.Future[str].
+        """
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(self._fetch(url), self._loop)
+
+    def fetch(self, url: str) -> str:
+        return self.submit(url).result()
+
+    # ---------- internals ----------
+    async def _fetch(self, url: str) -> str:
+        if not url:
             return ""
 
-        html = resp.text.strip()
-        if not html:
-            return ""
+        loop = asyncio.get_running_loop()
+        host = urlsplit(url).netloc.lower()
+        status = "error"
 
-        # ---------- Attempt 1: Readability ----------
         try:
-            doc = Document(html)
-            content_html = doc.summary(html_partial=True)
-            text = _html_to_text(content_html)
-            if _is_valid(text):
-                return text
-        except Exception:
-            pass
-
-        # ---------- Attempt 2: BeautifulSoup ----------
-        soup = BeautifulSoup(html, "html.parser")
-
-        # Remove scripts/styles
-        for tag in soup(["script", "style", "noscript"]):
-            tag.decompose()
-
-        paragraphs = [
-            p.get_text(" ", strip=True)
-            for p in soup.find_all("p")
-        ]
-
-        text = "\n".join(paragraphs)
-        if _is_valid(text):
+            # Known URL -> conditional GET against the stored validators
+            cached = await loop.run_in_executor(None, article_store.get, url)
+            headers = article_store.conditional_headers(cached)
+
+            async with _HostSlot(self, host):
+                started = loop.time()
+                async with self._session.get(url, headers=headers) as resp:
+                    status = resp.status
+
+                    if resp.status == 304 and cached:
+                        await loop.run_in_executor(None, article_store.mark_not_modified, url)
+                        return cached["text"]
+
+                    if resp.status != 200:
+                        return ""
+
+                    content_type = resp.headers.get("Content-Type", "")
+                    if not is_html(content_type):
+                        status = "not_html"
+                        return ""
+
+                    body = await self._read_capped(resp)
+                    etag = resp.headers.get("ETag")
+                    last_modified = resp.headers.get("Last-Modified")
+
+                metrics.FETCH_SECONDS.observe(loop.time() - started)
+
+            if not body:
+                status = "empty_or_too_large"
+                return ""
+
+            metrics.FETCH_BYTES.observe(len(body))
+
+            text = await loop.run_in_executor(
+                self._extract_pool,
+                extract_text, body, charset_from_content_type(content_type)
+            )
+
+            if text:
+                await loop.run_in_executor(
+                    None,
+                    lambda: article_store.put(url, text, etag=etag, last_modified=last_modified)
+                )
             return text
 
-        # ---------- Attempt 3: Meta description ----------
-        desc = soup.find("meta", attrs={"name": "description"})
-        if desc and desc.get("content"):
-            return desc["content"].strip()
+        except Exception as e:
+            print("Fetch failed:", url, repr(e))
+        finally:
+            metrics.FETCHES.inc(status=status)
+
+        return ""
+
+    async def _read_capped(self, resp) -> bytes:
+        """
+        Streams the body; returns b"" as soon as it exceeds MAX_HTML_BYTES.
+        """
+        if resp.content_length and resp.content_length > MAX_HTML_BYTES:
+            return b""
+
+        chunks = []
+        size = 0
+
+        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_HTML_BYTES:
+                return b""
+            chunks.append(chunk)
 
-    except Exception as e:
-        print("Fetch failed:", e)
+        return b"".join(chunks)
+
+
+class _HostSlot:
+    """
+    Holds one of the host's concurrency slots for the duration of a request,
+    after waiting out the host's politeness delay.
+    """
+
+    def __init__(self, engine: AsyncFetchEngine, host: str):
+        self.engine = engine
+        self.host = host
+
+    async def __aenter__(self):
+        engine = self.engine
+        slot = engine._host_slots.get(self.host)
+        if slot is None:
+            slot = engine._host_slots[self.host] = asyncio.Semaphore(FETCH_PER_HOST_CONCURRENCY)
+            engine._host_locks[self.host] = asyncio.Lock()
+
+        await slot.acquire()
+
+        try:
+            loop = asyncio.get_running_loop()
+            async with engine._host_locks[self.host]:
+                wait = engine._host_next_start.get(self.host, 0) - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                engine._host_next_start[self.host] = loop.time() + FETCH_HOST_DELAY_SECONDS
+        except BaseException:
+            slot.release()
+            raise
 
-    return ""
+    async def __aexit__(self, *exc):
+        self.engine._host_slots[self.host].release()
 
 
-# -----------------------------
-# Helpers
-# -----------------------------
-def _html_to_text(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-    return soup.get_text("\n", strip=True)
+engine = AsyncFetchEngine()
+atexit.register(engine.close)
 
 
-def _is_valid(text: str) -> bool:
-    if not text:
-        return False
+def fetch_article(url: str) -> str:
+    """
+    Blocking fetch + extraction of one article (runs on the shared engine).
+    """
+    return engine.fetch(url)
 
-    text = re.sub(r"\s+", " ", text).strip()
 
-    # Require minimum content
-    return len(text) > 500
+def submit_fetch(url: str):
+    """
+    Non-blocking fetch; returns a concurrent.futures.Future[str].
+    """
+    return engine.submit(url)
@@ -0,0 +1,187 @@
+# jobs.py
+import threading
+import time
+import uuid
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once cancellation has been requested."""
+
+
+class JobConflict(Exception):
+    """Raised by an exclusive submit while a job of the same kind/workspace is active."""
+
+    def __init__(self, job):
+        super().__init__(f"Job {job.id} is already {job.status}")
+        self.job = job
+
+
+class Job:
+    """
+    A single background run with per-stage progress counters.
+    Job state is only mutated through the methods below (thread-safe).
+    """
+
+    def __init__(self, kind: str, workspace: str = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.workspace = workspace
+        self.status = "queued"   # queued | running | succeeded | failed | cancelled
+        self.stage = None
+        self.stages = {}         # stage name -> pending | running | done
+        self.stage_timings = {}  # stage name -> {"started_at", "finished_at"}
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    # ---------- progress ----------
+    def set_stage(self, stage: str):
+        with self._lock:
+            self.stage = stage
+
+    def set_stage_status(self, stage: str, status: str):
+        with self._lock:
+            self.stages[stage] = status
+
+            timing = self.stage_timings.setdefault(stage, {"started_at": None, "finished_at": None})
+            if status == "running":
+                timing["started_at"] = time.time()
+            elif status == "done":
+                timing["finished_at"] = time.time()
+
+    def set_progress(self, key: str, value):
+        with self._lock:
+            self.progress[key] = value
+
+    def incr(self, key: str, amount: int = 1):
+        with self._lock:
+            self.progress[key] = self.progress.get(key, 0) + amount
+
+    # ---------- cancellation ----------
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(f"Job {self.id} cancelled")
+
+    # ---------- serialization ----------
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "workspace": self.workspace,
+                "status": self.status,
+                "stage": self.stage,
+                "stages": dict(self.stages),
+                "stage_timings": {k: dict(v) for k, v in self.stage_timings.items()},
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+                "cancel_requested": self.cancelled,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobManager:
+    """
+    Runs jobs on daemon threads and keeps them addressable by ID.
+    Finished jobs are kept (up to `max_finished`) so their final
+    progress can still be polled.
+    """
+
+    def __init__(self, max_finished: int = 50):
+        self.max_finished = max_finished
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn, *args, workspace: str = None, exclusive: bool = False,
+               **kwargs) -> Job:
+        """
+        Starts `fn(job, *args, **kwargs)` in the background.
+        The return value of `fn` becomes `job.result`.
+        With `exclusive`, raises JobConflict instead if a job of the same
+        kind and workspace is still active (checked and registered atomically).
+        """
+        job = Job(kind, workspace)
+
+        with self._lock:
+            if exclusive:
+                running = self._active(kind, workspace)
+                if running:
+                    raise JobConflict(running[0])
+            self._jobs[job.id] = job
+            self._prune()
+
+        thread = threading.Thread(
+            target=self._run,
+            args=(job, fn, args, kwargs),
+            name=f"job-{kind}-{job.id[:8]}",
+            daemon=True
+        )
+        thread.start()
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active(self, kind: str = None, workspace: str = None) -> list[Job]:
+        with self._lock:
+            return self._active(kind, workspace)
+
+    def list(self) -> list[Job]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    # ---------- internals ----------
+    def _active(self, kind: str, workspace: str):
+        return [
+            j for j in self._jobs.values()
+            if j.status in ("queued", "running")
+            and (kind is None or j.kind == kind)
+            and (workspace is None or j.workspace == workspace)
+        ]
+
+    def _run(self, job: Job, fn, args, kwargs):
+        job.status = "running"
+        job.started_at = time.time()
+
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = "cancelled" if job.cancelled else "succeeded"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            print(f"Job {job.id} failed:", e)
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            job.set_stage("done")
+
+    def _prune(self):
+        finished = [
+            j for j in self._jobs.values()
+            if j.status not in ("queued", "running")
+        ]
+        finished.sort(key=lambda j: j.created_at)
+
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            self._jobs.pop(job.id, None)
+
+
+manager = JobManager()
@@ -1,19 +1,167 @@
 # llm.py
+"""
+Shared gateway for every OpenAI call.
+
+- one pooled client for the whole process
+- AIMD concurrency: the in-flight limit grows by ~1 per window of
+  successes and is halved on 429s / timeouts (reduced more gently when
+  latency exceeds LLM_LATENCY_TARGET_SECONDS)
+- tokens-per-minute budget, so requests queue here instead of being
+  rejected by the provider
+- jittered exponential retries (honoring Retry-After)
+
+Calls that still fail after every retry raise `LLMUnavailable`; callers
+must not turn that into a made-up result.
+"""
 import os
+import threading
+import time
+
+import openai
 from openai import OpenAI
 from dotenv import load_dotenv
 
+import metrics
+from rate_limiter import TokenBucket, backoff_delay
+
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+MODEL = "gpt-4o-mini"
+
+# Match these to the OpenAI account tier
+LLM_TPM_BUDGET = int(os.getenv("LLM_TPM_BUDGET", 180_000))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 64))
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", 8))
+LLM_LATENCY_TARGET_SECONDS = float(os.getenv("LLM_LATENCY_TARGET_SECONDS", 30))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 60))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 5))
+LLM_BACKOFF_SECONDS = 1.0
+LLM_BACKOFF_CAP_SECONDS = 60.0
+
+# Reserved per call for the completion when charging the TPM budget
+COMPLETION_TOKENS_ESTIMATE = 300
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,   # includes timeouts
+    openai.InternalServerError,
+)
+
+
+class LLMUnavailable(Exception):
+    """Raised when an LLM call still fails after all retries."""
+
+
+class AdaptiveLimiter:
+    """
+    Additive-increase / multiplicative-decrease cap on in-flight calls.
+    Decreases are spaced at least `cooldown` seconds apart, so one burst
+    of concurrent 429s only halves the limit once.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 64, cooldown: float = 2.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.cooldown = cooldown
+        self.limit = float(min(max(initial, minimum), maximum))
+
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._cv = threading.Condition()
+
+    def acquire(self):
+        with self._cv:
+            self._cv.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+
+    def release(self, overloaded: bool = False, slow: bool = False):
+        with self._cv:
+            self._in_flight -= 1
+
+            if overloaded or slow:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    factor = 0.5 if overloaded else 0.9
+                    self.limit = max(self.minimum, self.limit * factor)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
 
-def call_llm(prompt: str) -> str:
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
+            metrics.LLM_CONCURRENCY_LIMIT.set(int(self.limit))
+            self._cv.notify_all()
+
+
+client = OpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    timeout=LLM_TIMEOUT_SECONDS,
+    max_retries=0   # retries happen below, under the shared limiter
+)
+
+_limiter = AdaptiveLimiter(LLM_INITIAL_CONCURRENCY, maximum=LLM_MAX_CONCURRENCY)
+_tpm = TokenBucket(rate=LLM_TPM_BUDGET / 60, capacity=LLM_TPM_BUDGET) if LLM_TPM_BUDGET > 0 else None
+
+
+def chat(messages: list[dict], purpose: str, model: str = MODEL, **kwargs):
+    """
+    One chat completion through the shared limiter, budget and retries.
+    Returns the provider response; raises LLMUnavailable once retries run out.
+    Non-retryable API errors (bad request, auth, ...) are raised as-is.
+    """
+    estimated_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+    estimated_tokens += COMPLETION_TOKENS_ESTIMATE
+    kwargs.setdefault("temperature", 0)
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        if _tpm:
+            _tpm.acquire(min(estimated_tokens, _tpm.capacity))
+
+        _limiter.acquire()
+        started = time.perf_counter()
+        try:
+            response = client.chat.completions.create(model=model, messages=messages, **kwargs)
+        except RETRYABLE_ERRORS as e:
+            overloaded = isinstance(e, (openai.RateLimitError, openai.APITimeoutError))
+            _limiter.release(overloaded=overloaded)
+            metrics.observe_llm_call(purpose, started, outcome=_outcome(e))
+
+            if isinstance(e, openai.RateLimitError) and _tpm:
+                _tpm.drain()
+
+            if attempt == LLM_MAX_RETRIES:
+                raise LLMUnavailable(f"{purpose}: {e}") from e
+
+            time.sleep(backoff_delay(
+                attempt, LLM_BACKOFF_SECONDS, LLM_BACKOFF_CAP_SECONDS,
+                getattr(e, "response", None)
+            ))
+            continue
+        except Exception:
+            _limiter.release()
+            metrics.observe_llm_call(purpose, started, outcome="error")
+            raise
+
+        latency = time.perf_counter() - started
+        _limiter.release(slow=latency > LLM_LATENCY_TARGET_SECONDS)
+        metrics.observe_llm_call(purpose, started, response)
+        return response
+
+
+def call_llm(prompt: str, purpose: str = "query_generation", **kwargs) -> str:
+    response = chat(
+        [
             {"role": "system", "content": "You are a precise financial analyst."},
             {"role": "user", "content": prompt}
         ],
-        temperature=0,
+        purpose,
+        **kwargs
     )
     return response.choices[0].message.content
+
+
+def _outcome(error: Exception) -> str:
+    if isinstance(error, openai.RateLimitError):
+        return "rate_limited"
+    if isinstance(error, openai.APITimeoutError):
+        return "timeout"
+    return "retryable_error"
+
@@ -0,0 +1,241 @@
+# metrics.py
+"""
+In-process counters and histograms, exported in the Prometheus text
+format by the /metrics endpoint. Every metric is defined at the bottom of
+this module so the exposition has one stable layout.
+
+    metrics.FETCHES.inc(status="200")
+    metrics.LLM_CONCURRENCY_LIMIT.set(8)
+    with metrics.BRAVE_REQUEST_SECONDS.time():
+        ...
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+_registry = []
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _label_text(self, key: tuple, extra: dict = None) -> str:
+        pairs = list(zip(self.labels, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{self._label_text(key)} {_number(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self._values = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{self._label_text(key)} {_number(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for key, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{self._label_text(key, {'le': _number(bound)})} {count}")
+            count = series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{self._label_text(key, {'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {count}")
+        return lines
+
+
+def render() -> str:
+    """
+    Every metric in the Prometheus text exposition format (0.0.4).
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+# --------------------------------------------------
+# Pipeline
+# --------------------------------------------------
+RUNS = Counter(
+    "pipeline_runs_total", "Search runs by mode and final status", ("mode", "status")
+)
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_seconds", "Wall time of each pipeline stage per run", ("stage",)
+)
+QUERY_GENERATION_SECONDS = Histogram(
+    "query_generation_seconds", "Query generation time per driver"
+)
+QUERY_GENERATIONS = Counter(
+    "query_generations_total", "Query generation attempts per driver", ("outcome",)
+)
+DROPS = Counter(
+    "pipeline_articles_dropped_total",
+    "Articles dropped before evaluation, by reason", ("reason",)
+)
+
+# --------------------------------------------------
+# Brave
+# --------------------------------------------------
+BRAVE_SEARCHES = Counter(
+    "brave_searches_total", "Searches answered from the cache or the live API", ("source",)
+)
+BRAVE_REQUESTS = Counter(
+    "brave_requests_total", "HTTP requests to the Brave API by status", ("status",)
+)
+BRAVE_REQUEST_SECONDS = Histogram(
+    "brave_request_seconds", "Latency of each Brave API request"
+)
+
+# --------------------------------------------------
+# Fetch + extraction
+# --------------------------------------------------
+FETCHES = Counter(
+    "fetch_requests_total", "Article downloads by HTTP status or outcome", ("status",)
+)
+FETCH_SECONDS = Histogram(
+    "fetch_seconds", "Article download time, excluding per-host queueing"
+)
+FETCH_BYTES = Histogram(
+    "fetch_bytes", "Downloaded HTML size", buckets=BYTES_BUCKETS
+)
+EXTRACTIONS = Counter(
+    "extractions_total", "Text extraction results by the path that succeeded", ("path",)
+)
+
+# --------------------------------------------------
+# LLM
+# --------------------------------------------------
+LLM_REQUESTS = Counter(
+    "llm_requests_total", "LLM calls by purpose and outcome", ("purpose", "outcome")
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_seconds", "LLM call latency", ("purpose",)
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Tokens reported by the provider", ("purpose", "kind")
+)
+LLM_PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens", "Prompt tokens per LLM call", ("purpose",), buckets=TOKEN_BUCKETS
+)
+LLM_PARSE_FAILURES = Counter(
+    "llm_parse_failures_total", "LLM responses that were not valid JSON of the expected shape",
+    ("purpose",)
+)
+LLM_CONCURRENCY_LIMIT = Gauge(
+    "llm_concurrency_limit", "Current adaptive cap on in-flight LLM calls"
+)
+EVAL_CACHE_LOOKUPS = Counter(
+    "eval_cache_lookups_total", "Evaluation cache lookups", ("result",)
+)
+
+
+# --------------------------------------------------
+# Helpers
+# --------------------------------------------------
+def observe_llm_call(purpose: str, started: float, response=None, outcome: str = "ok"):
+    """
+    Records latency, outcome and token usage of one chat completion
+    attempt; `started` is a time.perf_counter() value.
+    """
+    LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, purpose=purpose)
+    LLM_REQUESTS.inc(purpose=purpose, outcome=outcome)
+
+    usage = getattr(response, "usage", None)
+    if usage:
+        LLM_TOKENS.inc(usage.prompt_tokens, purpose=purpose, kind="prompt")
+        LLM_TOKENS.inc(usage.completion_tokens, purpose=purpose, kind="completion")
+        LLM_PROMPT_TOKENS.observe(usage.prompt_tokens, purpose=purpose)
@@ -0,0 +1,708 @@
+# pipeline.py
+import heapq
+import itertools
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+import metrics
+from jobs import Job, JobCancelled
+from query_generator import generate_queries_for_driver
+from search_executor import search_query
+from brave_client import BRAVE_CONCURRENCY
+from deduplicator import IncrementalDeduplicator, BodyDeduplicator, QueryClusterer
+from url_utils import canonicalize_url
+from fetcher import submit_fetch, FETCH_CONCURRENCY
+from relevance import prefilter_score, passes_prefilter
+from llm import LLMUnavailable
+from rate_limiter import WorkerBudget
+from state import Workspace
+from article_evaluator import evaluate_article, evaluate_articles, batch_mode_enabled, EVAL_BATCH_SIZE
+
+load_dotenv()
+
+SEARCH_FRESHNESS_DAYS = int(os.getenv("SEARCH_FRESHNESS_DAYS", 4))
+
+# Incremental runs search only the days since the last successful run
+INCREMENTAL_NARROW_FRESHNESS = os.getenv("INCREMENTAL_NARROW_FRESHNESS", "true").lower() == "true"
+
+# Bounded hand-off between stages keeps memory flat on large runs
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 100))
+
+# Drivers generated concurrently; the LLM gateway paces the actual calls
+QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", 4))
+SEARCH_WORKERS = BRAVE_CONCURRENCY   # paced by the shared Brave rate limiter
+FILTER_WORKERS = 2
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", min(32, (os.cpu_count() or 1) + 4)))
+
+# Early stop: once a driver has this many articles scoring at least
+# DRIVER_TARGET_MIN_SCORE in a run, its remaining work is skipped (0 = off)
+DRIVER_TARGET_ARTICLES = int(os.getenv("DRIVER_TARGET_ARTICLES", 0))
+DRIVER_TARGET_MIN_SCORE = int(os.getenv("DRIVER_TARGET_MIN_SCORE", 4))
+
+# Downloads handed to the fetch engine at once. Kept well below
+# FETCH_CONCURRENCY: the engine serves each host first-come, first-served,
+# so only a small window lets Brave rank decide what is fetched next
+FETCH_WINDOW = int(os.getenv("FETCH_WINDOW", min(FETCH_CONCURRENCY, 32)))
+
+# Global fetch / evaluation slots, split evenly between runs in progress
+# (one per workspace) so concurrent runs share them fairly
+FETCH_BUDGET = WorkerBudget(FETCH_WINDOW)
+EVAL_BUDGET = WorkerBudget(int(os.getenv("EVAL_WORKER_BUDGET", EVAL_WORKERS)))
+
+# Sorts after every real Brave rank
+_UNRANKED = 1_000_000
+
+_DONE = object()
+
+
+# --------------------------------------------------
+# Stage plumbing
+# --------------------------------------------------
+class _Stage:
+    """
+    `workers` threads pulling items from `inbox` and calling
+    `handler(item, emit)`; `emit` pushes to `outbox` (blocking when full).
+    Once every worker has seen the end marker, `on_finish(emit)` runs
+    (if given) and a single end marker is forwarded to `outbox`.
+    """
+
+    def __init__(self, name: str, handler, inbox: queue.Queue, outbox, workers: int, job: Job,
+                 on_finish=None):
+        self.name = name
+        self.handler = handler
+        self.on_finish = on_finish
+        self.inbox = inbox
+        self.outbox = outbox
+        self.job = job
+
+        self._remaining = workers
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self):
+        self.job.set_stage_status(self.name, "running")
+        self._started = time.monotonic()
+        for t in self._threads:
+            t.start()
+
+    def join(self):
+        for t in self._threads:
+            t.join()
+
+    def _emit(self, item):
+        self.outbox.put(item)
+
+    def _work(self):
+        try:
+            while True:
+                item = self.inbox.get()
+
+                if item is _DONE:
+                    # Let sibling workers see the end marker too
+                    self.inbox.put(_DONE)
+                    break
+
+                # Keep draining on cancel so upstream never blocks on a full queue
+                if self.job.cancelled:
+                    continue
+
+                try:
+                    self.handler(item, self._emit)
+                except JobCancelled:
+                    pass
+                except Exception as e:
+                    print(f"Pipeline stage '{self.name}' failed:", e)
+        finally:
+            with self._lock:
+                self._remaining -= 1
+                last = self._remaining == 0
+
+            if last:
+                if self.on_finish and not self.job.cancelled:
+                    try:
+                        self.on_finish(self._emit)
+                    except Exception as e:
+                        print(f"Pipeline stage '{self.name}' failed to finish:", e)
+
+                self.job.set_stage_status(self.name, "done")
+                metrics.STAGE_SECONDS.observe(time.monotonic() - self._started, stage=self.name)
+                if self.outbox is not None:
+                    self.outbox.put(_DONE)
+
+
+class _RankQueue:
+    """
+    Stage inbox that hands out (driver, query, item, ...) tasks by Brave
+    rank, best first, rotating between drivers on equal rank, instead of
+    in arrival order. `put` blocks while `maxsize` tasks are waiting.
+
+    `stop_driver` discards a driver's waiting tasks and any it receives
+    later; each discarded task is passed to `on_drop`.
+    """
+
+    def __init__(self, maxsize: int = 0, on_drop=None):
+        self.maxsize = maxsize
+        self.on_drop = on_drop
+
+        self._pending = {}        # driver -> heap of (rank, seq, task)
+        self._last_served = {}    # driver -> tick of its last hand-out
+        self._stopped = set()
+        self._size = 0
+        self._closed = False
+        self._seq = itertools.count()
+        self._cv = threading.Condition()
+
+    def put(self, task):
+        with self._cv:
+            if task is _DONE:
+                self._closed = True
+                self._cv.notify_all()
+                return
+
+            driver = task[0]
+            if self.maxsize:
+                self._cv.wait_for(lambda: self._size < self.maxsize or driver in self._stopped)
+
+            if driver not in self._stopped:
+                rank = task[2].get("rank") or _UNRANKED
+                heapq.heappush(self._pending.setdefault(driver, []), (rank, next(self._seq), task))
+                self._size += 1
+                self._cv.notify_all()
+                return
+
+        self._drop([task])
+
+    def get(self):
+        with self._cv:
+            self._cv.wait_for(lambda: self._size or self._closed)
+            if not self._size:
+                return _DONE
+
+            driver = min(
+                self._pending,
+                key=lambda d: (self._pending[d][0][0], self._last_served.get(d, -1))
+            )
+            heap = self._pending[driver]
+            _, _, task = heapq.heappop(heap)
+            if not heap:
+                del self._pending[driver]
+
+            self._last_served[driver] = next(self._seq)
+            self._size -= 1
+            self._cv.notify_all()
+            return task
+
+    def stop_driver(self, driver: str):
+        with self._cv:
+            self._stopped.add(driver)
+            dropped = [task for _, _, task in self._pending.pop(driver, [])]
+            self._size -= len(dropped)
+            self._cv.notify_all()
+
+        self._drop(dropped)
+
+    def stopped(self, driver: str) -> bool:
+        return driver in self._stopped
+
+    def _drop(self, tasks: list):
+        if self.on_drop:
+            for task in tasks:
+                self.on_drop(task)
+
+
+# --------------------------------------------------
+# Search run
+# --------------------------------------------------
+RUN_MODES = ("full", "incremental", "partial")
+
+
+def run_search_pipeline(job: Job, workspace: Workspace, context: str, metric: str,
+                        drivers: list[str], mode: str = "full") -> dict:
+    """
+    Search run as a streaming pipeline:
+
+        drivers -> query generation -> cross-driver query clustering
+                -> Brave search -> URL/snippet dedup
+                -> fetch + lexical pre-filter + body dedup -> evaluate
+
+    Stages run concurrently and are connected by bounded queues, so the
+    first articles are evaluated while later queries are still being
+    generated. Fetch and evaluation take articles best Brave rank first,
+    round-robin across drivers; with DRIVER_TARGET_ARTICLES set, a driver
+    that reaches its target skips the rest of its work. Progress is
+    reported on `job`; results are written to `workspace` as each article
+    completes. Runs in different workspaces may overlap; they split the
+    global fetch and evaluation budgets evenly.
+
+    Modes:
+        full        - start from scratch
+        incremental - keep existing results, skip URLs an earlier run
+                      already processed and merge new articles in
+        partial     - rebuild only `drivers` (added/edited on the context
+                      page); every other driver's results are kept
+    """
+    started_at = time.time()
+    incremental = mode == "incremental"
+    summary = None
+    status = "failed"
+
+    try:
+        if mode == "full":
+            # 🔥 Full run: reset old results before running
+            workspace.reset_results()
+        elif mode == "partial":
+            workspace.drop_drivers(drivers)
+
+        days = (
+            _incremental_freshness_days(workspace, started_at)
+            if incremental else SEARCH_FRESHNESS_DAYS
+        )
+
+        # Every query set and result is committed as it is produced,
+        # so a cancelled or crashed run keeps its partial output
+        summary = _run_stages(job, workspace, context, metric, drivers, days, incremental)
+        summary["mode"] = mode
+
+        if not job.cancelled:
+            # Changed drivers start without queries; once a run has stored
+            # some, it covered them, whatever the mode
+            with workspace.lock:
+                covered = {d for d in drivers if workspace.data["queries"].get(d)}
+                workspace.set_stale_drivers(
+                    [d for d in workspace.data["stale_drivers"] if d not in covered]
+                )
+
+            # After a partial run the other drivers were last searched
+            # earlier; keep their timestamp
+            if mode != "partial":
+                workspace.set_last_successful_run(started_at)
+
+        status = "cancelled" if job.cancelled else "succeeded"
+        return summary
+
+    finally:
+        metrics.RUNS.inc(mode=mode, status=status)
+
+        # Timing breakdown, stored next to the results it produced
+        job_info = job.to_dict()
+        try:
+            workspace.record_run(
+                job.id, mode, status, started_at, time.time(),
+                job_info["stage_timings"], job_info["progress"], summary
+            )
+        except Exception as e:
+            print("Could not record run timings:", e)
+
+
+def _incremental_freshness_days(workspace: Workspace, now: float) -> int:
+    last_run = workspace.data.get("last_successful_run")
+    if not INCREMENTAL_NARROW_FRESHNESS or not last_run:
+        return SEARCH_FRESHNESS_DAYS
+
+    # Brave freshness ranges are whole days
+    elapsed_days = math.ceil((now - last_run) / 86400)
+    return max(1, min(SEARCH_FRESHNESS_DAYS, elapsed_days))
+
+
+def _run_stages(job: Job, workspace: Workspace, context: str, metric: str,
+                drivers: list[str], days: int, incremental: bool) -> dict:
+    job.set_stage("pipeline")
+    job.set_progress("drivers_total", len(drivers))
+    job.set_progress("freshness_days", days)
+
+    clusterer = QueryClusterer()
+    dedup = IncrementalDeduplicator(simhash_threshold=5)
+    body_dedup = BodyDeduplicator(simhash_threshold=3)
+
+    # ---------- STAGE 1: QUERY GENERATION ----------
+    def generate(driver, emit):
+        # Incremental runs re-search the stored queries, so new results
+        # line up with the existing ones and no generation is paid for
+        with workspace.lock:
+            stored = list(workspace.data["queries"].get(driver, [])) if incremental else []
+
+        if stored:
+            queries = stored
+            job.incr("queries_reused", len(queries))
+        else:
+            queries = generate_for(driver)
+            job.incr("queries_generated", len(queries))
+
+        job.incr("drivers_done")
+
+        for query in queries:
+            emit((driver, query))
+
+    def generate_for(driver):
+        started = time.perf_counter()
+        try:
+            queries = generate_queries_for_driver(
+                context, metric, driver, prompts=workspace.prompts.load()
+            )
+            metrics.QUERY_GENERATIONS.inc(outcome="ok")
+        except Exception as e:
+            # Stored queries (if any) are left as they were
+            print(f"Query generation failed for driver '{driver}':", e)
+            metrics.QUERY_GENERATIONS.inc(outcome="failed")
+            return []
+        finally:
+            metrics.QUERY_GENERATION_SECONDS.observe(time.perf_counter() - started)
+
+        workspace.set_queries(driver, queries)
+        return queries
+
+    # ---------- STAGE 2: QUERY CLUSTERING ----------
+    # Near-identical queries across drivers share one Brave search
+    def cluster_queries(task, emit):
+        driver, query = task
+        if article_q.stopped(driver):
+            job.incr("searches_skipped")
+            return
+
+        cluster, action = clusterer.join(driver, query)
+
+        if action == "search":
+            job.incr("searches_planned")
+            emit(("search", cluster, driver, query))
+            return
+
+        job.incr("queries_clustered")
+        metrics.BRAVE_SEARCHES.inc(source="shared")
+        if action == "late":
+            # Its cluster was already searched; reuse those results
+            emit(("late", cluster, driver, query))
+
+    # ---------- STAGE 3: BRAVE SEARCH ----------
+    def fan_out(cluster, members, results, emit):
+        for driver, query in members:
+            job.incr("results_found", len(results))
+            for item in results:
+                # Traceability: attributed to the member's own query,
+                # with the query Brave actually ran
+                emit((driver, query, {
+                    **item, "driver": driver, "query": query, "searched_query": cluster.query
+                }))
+
+    def search(task, emit):
+        action, cluster, driver, query = task
+
+        if action == "late":
+            fan_out(cluster, [(driver, query)], cluster.results, emit)
+            return
+
+        results = []
+        try:
+            results = search_query(driver, query, days=days)
+        finally:
+            members = clusterer.complete(cluster, results)
+            job.incr("searches_done")
+
+        fan_out(cluster, members, results, emit)
+
+    # ---------- STAGE 4: DEDUPLICATION ----------
+    def deduplicate(task, emit):
+        driver, query, item = task
+
+        if not dedup.accept(driver, item):
+            job.incr("duplicates_dropped")
+            metrics.DROPS.inc(reason="duplicate_url_or_snippet")
+            return
+
+        # Seen by an earlier run -> its result (if any) is already stored
+        if incremental and workspace.is_processed(driver, canonicalize_url(item.get("url"))):
+            job.incr("already_processed")
+            metrics.DROPS.inc(reason="already_processed")
+            return
+
+        job.incr("articles_queued")
+        emit(task)
+
+    # ---------- STAGE 5: FETCH ----------
+    # Downloads run on the asyncio fetch engine. One dispatcher thread keeps
+    # up to this run's share of FETCH_WINDOW in flight; a slot is freed
+    # once the filter stage has taken the article, which keeps memory bounded.
+    fetch_slots = FETCH_BUDGET.share()
+    outstanding = {"count": 0}
+    in_flight = {}   # driver -> fetch futures not yet done
+    outstanding_cv = threading.Condition()
+
+    def dispatch_fetch(task, emit):
+        driver, query, item = task
+
+        while not fetch_slots.acquire(timeout=0.5):
+            job.check_cancelled()
+
+        # The driver may have reached its target while we waited for a slot
+        if article_q.stopped(driver):
+            fetch_slots.release()
+            skip_for_target(task)
+            return
+
+        with outstanding_cv:
+            outstanding["count"] += 1
+            future = submit_fetch(item.get("url", ""))
+            in_flight.setdefault(driver, set()).add(future)
+
+        def on_done(future):
+            with outstanding_cv:
+                in_flight[driver].discard(future)
+            emit((task, future))
+            with outstanding_cv:
+                outstanding["count"] -= 1
+                outstanding_cv.notify_all()
+
+        future.add_done_callback(on_done)
+
+    def cancel_fetches(driver):
+        with outstanding_cv:
+            futures = list(in_flight.get(driver, ()))
+        for future in futures:
+            future.cancel()
+
+    def wait_for_fetches(emit):
+        with outstanding_cv:
+            outstanding_cv.wait_for(lambda: outstanding["count"] == 0)
+
+    # ---------- STAGE 6: PRE-FILTER + BODY DEDUP ----------
+    def filter_fetched(fetched, emit):
+        task, future = fetched
+        driver, query, item = task
+
+        try:
+            if future.cancelled():
+                # Its driver reached its target mid-download
+                skip_for_target(task)
+                return
+            article_text = future.result()
+        finally:
+            fetch_slots.release()
+
+        job.incr("articles_fetched")
+        if not article_text:
+            # Not recorded as processed, so a later run retries it
+            metrics.DROPS.inc(reason="fetch_failed")
+            return
+
+        # Cheap local relevance check before paying for an LLM call
+        item = {**item, "prefilter_score": prefilter_score(article_text, driver, query, context)}
+        if not passes_prefilter(item["prefilter_score"]):
+            job.incr("prefiltered_out")
+            metrics.DROPS.inc(reason="prefilter")
+            mark_processed(driver, item)
+            return
+
+        # Syndicated / mirrored copies share the first copy's evaluation
+        source = {"url": item.get("url"), "source": item.get("source")}
+        with workspace.lock:
+            duplicate, sources, owner = body_dedup.register(driver, article_text, source)
+            if duplicate:
+                # No-op if the first copy is still being evaluated. Under
+                # global scope the URL is stored once, so it alone is the key
+                workspace.update_sources(
+                    sources[0]["url"], sources,
+                    driver=owner if body_dedup.scope == "driver" else None
+                )
+        if duplicate:
+            job.incr("body_duplicates")
+            metrics.DROPS.inc(reason="duplicate_body")
+            mark_processed(driver, item)
+            return
+
+        item["sources"] = sources
+        emit((driver, query, item, article_text))
+
+    def mark_processed(driver, item):
+        workspace.mark_processed(driver, canonicalize_url(item.get("url")))
+
+    # ---------- STAGE 7: EVALUATE ----------
+    # EVAL_WORKERS threads per run, but only this run's share of
+    # EVAL_BUDGET of them call the LLM at once
+    eval_slots = EVAL_BUDGET.share()
+
+    def record_result(driver, query, item, evaluation):
+        job.incr("articles_evaluated")
+
+        result = {
+            "title": item.get("title"),
+            "url": item.get("url"),
+            "source": item.get("source"),
+            "published": item.get("published"),
+            "rank": item.get("rank"),
+            "prefilter_score": item.get("prefilter_score"),
+            "score": evaluation.get("score"),
+            "summary": evaluation.get("summary"),
+            "truncation": evaluation.get("truncation"),
+            "searched_query": item.get("searched_query"),
+            "sources": item.get("sources", []),
+        }
+
+        # Committed immediately; visible while the run is still going
+        workspace.add_result(driver, query, result)
+        mark_processed(driver, item)
+        count_toward_target(driver, result["score"])
+
+    # Per-driver early stop
+    target_hits = {}
+    target_lock = threading.Lock()
+
+    def count_toward_target(driver, score):
+        if not DRIVER_TARGET_ARTICLES or not isinstance(score, int) or score < DRIVER_TARGET_MIN_SCORE:
+            return
+
+        with target_lock:
+            target_hits[driver] = target_hits.get(driver, 0) + 1
+            if target_hits[driver] != DRIVER_TARGET_ARTICLES:
+                return
+
+        job.incr("drivers_target_met")
+        for q in (article_q, fetched_q):
+            q.stop_driver(driver)
+        cancel_fetches(driver)
+
+    def skip_for_target(task):
+        # Not marked processed: a later run may still pick it up
+        job.incr("skipped_target_met")
+        metrics.DROPS.inc(reason="driver_target_met")
+
+    def evaluation_failed(count, error):
+        # No made-up score; the URL stays unprocessed so a later run retries it
+        print("Evaluation unavailable:", error)
+        job.incr("evaluations_failed", count)
+        metrics.DROPS.inc(count, reason="llm_unavailable")
+
+    def evaluate(task, emit):
+        driver, query, item, article_text = task
+        if fetched_q.stopped(driver):
+            skip_for_target(task)
+            return
+
+        try:
+            with eval_slots:
+                evaluation = evaluate_article(
+                    article=article_text,
+                    context=context,
+                    metric=metric,
+                    driver=driver,
+                    query=query,
+                    prompts=workspace.prompts.load()
+                )
+        except LLMUnavailable as e:
+            evaluation_failed(1, e)
+            return
+
+        record_result(driver, query, item, evaluation)
+
+    # Batch mode: buffer fetched articles per (driver, query) until a batch is full
+    pending_batches = {}
+    batch_lock = threading.Lock()
+
+    def evaluate_batch(key, batch):
+        driver, query = key
+        if fetched_q.stopped(driver):
+            for task in batch:
+                skip_for_target(task)
+            return
+
+        try:
+            with eval_slots:
+                evaluations = evaluate_articles(
+                    [article_text for _, article_text in batch],
+                    context=context,
+                    metric=metric,
+                    driver=driver,
+                    query=query,
+                    prompts=workspace.prompts.load()
+                )
+        except LLMUnavailable as e:
+            evaluation_failed(len(batch), e)
+            return
+
+        for (item, _), evaluation in zip(batch, evaluations):
+            record_result(driver, query, item, evaluation)
+
+    def evaluate_batched(task, emit):
+        driver, query, item, article_text = task
+        key = (driver, query)
+
+        with batch_lock:
+            batch = pending_batches.setdefault(key, [])
+            batch.append((item, article_text))
+            if len(batch) < EVAL_BATCH_SIZE:
+                return
+            del pending_batches[key]
+
+        evaluate_batch(key, batch)
+
+    def flush_batches(emit):
+        with batch_lock:
+            leftovers = list(pending_batches.items())
+            pending_batches.clear()
+
+        with ThreadPoolExecutor(max_workers=EVAL_WORKERS) as executor:
+            for future in [executor.submit(evaluate_batch, k, b) for k, b in leftovers]:
+                future.result()
+
+    # ---------- WIRING ----------
+    driver_q = queue.Queue()
+    query_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    cluster_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    result_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    # Search results are small, so fetch sees every one of them to rank
+    article_q = _RankQueue(on_drop=skip_for_target)
+    downloaded_q = queue.Queue()   # bounded by fetch_slots; filled from the fetch loop
+    fetched_q = _RankQueue(maxsize=PIPELINE_QUEUE_SIZE, on_drop=skip_for_target)
+
+    for driver in drivers:
+        driver_q.put(driver)
+    driver_q.put(_DONE)
+
+    stages = [
+        _Stage("query_generation", generate, driver_q, query_q, QUERY_WORKERS, job),
+        _Stage("query_clustering", cluster_queries, query_q, cluster_q, 1, job),
+        _Stage("search", search, cluster_q, result_q, SEARCH_WORKERS, job),
+        _Stage("dedup", deduplicate, result_q, article_q, 1, job),
+        _Stage("fetch", dispatch_fetch, article_q, downloaded_q, 1, job,
+               on_finish=wait_for_fetches),
+        _Stage("filter", filter_fetched, downloaded_q, fetched_q, FILTER_WORKERS, job),
+    ]
+
+    if batch_mode_enabled():
+        stages.append(_Stage(
+            "evaluation", evaluate_batched, fetched_q, None, EVAL_WORKERS, job,
+            on_finish=flush_batches
+        ))
+    else:
+        stages.append(_Stage("evaluation", evaluate, fetched_q, None, EVAL_WORKERS, job))
+
+    try:
+        for stage in stages:
+            stage.start()
+        for stage in stages:
+            stage.join()
+    finally:
+        fetch_slots.close()
+        eval_slots.close()
+
+    progress = job.to_dict()["progress"]
+
+    return {
+        "freshness_days": days,
+        "drivers": len(drivers),
+        "queries_generated": progress.get("queries_generated", 0),
+        "queries_reused": progress.get("queries_reused", 0),
+        "searches": progress.get("searches_done", 0),
+        "articles_processed": progress.get("articles_queued", 0),
+        "already_processed": progress.get("already_processed", 0),
+        "evaluations_failed": progress.get("evaluations_failed", 0),
+        "drivers_target_met": progress.get("drivers_target_met", 0),
+        "skipped_target_met": progress.get("skipped_target_met", 0),
+        "parallel_execution": True
+    }
@@ -1,11 +1,81 @@
+import hashlib
 import json
+import os
+import threading
+import time
 
 PROMPTS_FILE = "prompts_store.json"
 
-def load_prompts():
-    with open(PROMPTS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+# How often load() may stat the file for changes
+RELOAD_CHECK_SECONDS = 1.0
+
+
+def version_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:12]
+
+
+class PromptStore:
+    """
+    In-memory copy of one prompts JSON file, reloaded when the file
+    changes. Each workspace has its own; `load_prompts` below uses the
+    default PROMPTS_FILE.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._prompts = {}
+        self._versions = {}
+
+    def _refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < RELOAD_CHECK_SECONDS:
+            return
+        self._checked_at = now
+
+        mtime = os.stat(self.path).st_mtime_ns
+        if not force and mtime == self._mtime:
+            return
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            prompts = json.load(f)
 
-def save_prompts(prompts):
-    with open(PROMPTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(prompts, f, indent=2, ensure_ascii=False)
+        self._prompts = prompts
+        self._versions = {k: version_hash(v) for k, v in prompts.items()}
+        self._mtime = mtime
+
+    def load(self) -> dict:
+        with self._lock:
+            self._refresh()
+            return dict(self._prompts)
+
+    def versions(self) -> dict:
+        """
+        Short content hash per prompt key; changes whenever the prompt text does.
+        """
+        with self._lock:
+            self._refresh()
+            return dict(self._versions)
+
+    def save(self, prompts: dict):
+        with self._lock:
+            # Write-then-rename so readers never see a half-written file
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(prompts, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+            self._refresh(force=True)
+
+
+_default = PromptStore(PROMPTS_FILE)
+
+
+def load_prompts():
+    """
+    In-memory copy of prompts_store.json, reloaded when the file changes.
+    """
+    return _default.load()
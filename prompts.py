@@ -46,24 +46,12 @@ Do not invent facts.
 # HARD-CONTRACT SCHEMA (DO NOT EDIT)
 # =========================================================
 
-QUERY_GENERATION_SCHEMA = """
-{
-  "queries": [
-    "<query 1>",
-    "<query 2>",
-    "<query 3>",
-    "<query 4>",
-    "<query 5>",
-    "<query 6>",
-    "<query 7>",
-    "<query 8>",
-    "<query 9>",
-    "<query 10>",
-    "<query 11>",
-    "<query 12>"
-  ]
-}
-""".strip()
+def query_generation_schema(count: int) -> str:
+    """
+    Output format for a request of `count` queries (one slot per query).
+    """
+    slots = ",\n".join(f'    "<query {i}>"' for i in range(1, count + 1))
+    return '{\n  "queries": [\n' + slots + '\n  ]\n}'
 
 
 ARTICLE_EVALUATION_SCHEMA = """
@@ -1,16 +1,72 @@
 import json
-from llm import call_llm
-from prompts import QUERY_GENERATION_SCHEMA
+import os
+
+import metrics
+from llm import call_llm, LLMUnavailable
+from prompts import query_generation_schema
 from prompt_manager import load_prompts
 
 EXPECTED_COUNT = 12
 
+# Text the model echoes back from the examples instead of writing a query
+PLACEHOLDER_MARKERS = ("external ecosystem signal", "placeholder", "<query")
+
+# Follow-up requests for just the missing queries before giving up
+QUERY_TOPUP_ATTEMPTS = int(os.getenv("QUERY_TOPUP_ATTEMPTS", 2))
+
 
-def generate_queries_for_driver(context: str, metric: str, driver: str) -> list[str]:
-    prompts = load_prompts()
+def generate_queries_for_driver(context: str, metric: str, driver: str,
+                                prompts: dict = None) -> list[str]:
+    """
+    Up to EXPECTED_COUNT search queries for one driver.
+
+    Valid queries from every response are kept; if some are missing or
+    malformed, smaller top-up requests ask for just the remainder. If the
+    model never gets there, the valid queries so far are returned, so a
+    driver is never dropped over one bad response; raises only when there
+    are none. `prompts` defaults to the global prompt store.
+    """
+    prompts = prompts if prompts is not None else load_prompts()
     instructions = prompts["PROMPT_BUILDER_INSTRUCTIONS"]
 
-    prompt = f"""
+    accepted = []
+
+    for _ in range(1 + QUERY_TOPUP_ATTEMPTS):
+        missing = EXPECTED_COUNT - len(accepted)
+        if missing <= 0:
+            break
+
+        prompt = _build_prompt(instructions, context, metric, driver, missing, accepted)
+        try:
+            raw = call_llm(prompt, response_format={"type": "json_object"})
+        except LLMUnavailable:
+            if not accepted:
+                raise
+            break
+
+        for q in _parse_queries(raw):
+            if _is_valid_query(q) and q.lower() not in {a.lower() for a in accepted}:
+                accepted.append(q)
+
+    if not accepted:
+        raise ValueError("Query generation failed: no valid queries")
+
+    if len(accepted) < EXPECTED_COUNT:
+        print(f"Query generation for '{driver}' returned {len(accepted)}/{EXPECTED_COUNT} valid queries")
+    return accepted[:EXPECTED_COUNT]
+
+
+def _build_prompt(instructions: str, context: str, metric: str, driver: str,
+                  count: int, existing: list[str]) -> str:
+    already = ""
+    if existing:
+        already = "\nAlready generated (do NOT repeat or paraphrase these):\n" + "\n".join(
+            f"- {q}" for q in existing
+        )
+
+    # Stable prefix first (instructions, rules, format, context, metric) and the
+    # per-driver tail last, so provider-side prompt caching can reuse the prefix
+    return f"""
 {instructions}
 
 You are generating SEARCH QUERIES for an AI search engine (Brave).
@@ -28,7 +84,7 @@ Each query MUST describe a REAL-WORLD EXTERNAL EVENT.
 - placeholder query
 
 STRICT RULES:
-- Generate EXACTLY {EXPECTED_COUNT} queries
+- Generate EXACTLY {count} queries
 - Each query must be 10–15 words
 - Mention REAL companies, operators, facilities, or infrastructure
 - Focus on EXTERNAL signals only
@@ -37,6 +93,9 @@ STRICT RULES:
 - No explanations
 - No generic language
 
+OUTPUT FORMAT (STRICT JSON ONLY):
+{query_generation_schema(count)}
+
 Context:
 {context}
 
@@ -45,33 +104,27 @@ Metric:
 
 Driver:
 {driver}
+{already}""".strip()
 
-OUTPUT FORMAT (STRICT JSON ONLY):
-{QUERY_GENERATION_SCHEMA}
-""".strip()
-
-    raw = call_llm(prompt)
 
+def _parse_queries(raw: str) -> list[str]:
     try:
-        data = json.loads(raw)
-        queries = data.get("queries", [])
+        queries = json.loads(raw).get("queries", [])
     except Exception:
-        raise ValueError("Query generation failed: invalid JSON")
+        metrics.LLM_PARSE_FAILURES.inc(purpose="query_generation")
+        return []
 
-    # Final hard sanity check
-    cleaned = []
-    for q in queries:
-        if not isinstance(q, str):
-            continue
-        if len(q.split()) < 8:
-            continue
-        if "external ecosystem signal" in q.lower():
-            continue
-        cleaned.append(q.strip())
-
-    if len(cleaned) != EXPECTED_COUNT:
-        raise ValueError(
-            f"Query generation failed: expected {EXPECTED_COUNT}, got {len(cleaned)}"
-        )
+    if not isinstance(queries, list):
+        metrics.LLM_PARSE_FAILURES.inc(purpose="query_generation")
+        return []
+
+    return [q.strip() for q in queries if isinstance(q, str) and q.strip()]
 
-    return cleaned
+
+def _is_valid_query(query: str) -> bool:
+    # Final hard sanity check
+    if len(query.split()) < 8:
+        return False
+    if any(marker in query.lower() for marker in PLACEHOLDER_MARKERS):
+        return False
+    return True
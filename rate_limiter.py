@@ -0,0 +1,150 @@
+# rate_limiter.py
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+    `rate` tokens are added per second, up to `capacity` (burst size).
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0):
+        """
+        Blocks until `tokens` are available, then takes them.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """
+        Takes `tokens` if available right now; never blocks.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def drain(self):
+        """
+        Empties the bucket, e.g. after the server signalled a rate limit.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = 0.0
+
+
+def backoff_delay(attempt: int, base: float, cap: float, response=None) -> float:
+    """
+    Seconds to wait before retrying. Honors Retry-After when `response`
+    carries it, else jittered exponential backoff; both capped at `cap`.
+    """
+    headers = getattr(response, "headers", None)
+    retry_after = headers.get("Retry-After") if headers is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), cap)
+        except ValueError:
+            pass
+
+    delay = min(cap, base * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class WorkerBudget:
+    """
+    Fixed number of worker slots shared by concurrent runs.
+    Each run takes a `share()`; while n shares are open, each may hold at
+    most total // n slots (at least one), so one large run cannot starve
+    the others. A run over its share (because another just started)
+    gets no new slots until it is back under it.
+    """
+
+    def __init__(self, total: int):
+        self.total = max(1, int(total))
+
+        self._held = {}   # share -> slots in use
+        self._cv = threading.Condition()
+
+    def share(self) -> "BudgetShare":
+        share = BudgetShare(self)
+        with self._cv:
+            self._held[share] = 0
+            self._cv.notify_all()
+        return share
+
+    def _limit(self) -> int:
+        return max(1, self.total // max(1, len(self._held)))
+
+    def _acquire(self, share, timeout: float = None) -> bool:
+        with self._cv:
+            ok = self._cv.wait_for(
+                lambda: self._held[share] < self._limit()
+                and sum(self._held.values()) < self.total,
+                timeout
+            )
+            if ok:
+                self._held[share] += 1
+            return ok
+
+    def _release(self, share):
+        with self._cv:
+            if share in self._held:
+                self._held[share] -= 1
+            self._cv.notify_all()
+
+    def _close(self, share):
+        with self._cv:
+            self._held.pop(share, None)
+            self._cv.notify_all()
+
+
+class BudgetShare:
+    """
+    One run's slice of a WorkerBudget; used like a semaphore.
+    """
+
+    def __init__(self, budget: WorkerBudget):
+        self.budget = budget
+
+    def acquire(self, timeout: float = None) -> bool:
+        return self.budget._acquire(self, timeout)
+
+    def release(self):
+        self.budget._release(self)
+
+    def close(self):
+        self.budget._close(self)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,232 @@
+# relevance.py
+import math
+import os
+import re
+from collections import Counter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Articles scoring below this never reach the LLM (0 = record only)
+PREFILTER_THRESHOLD = float(os.getenv("PREFILTER_THRESHOLD", 0.05))
+
+# BM25 saturation / length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+AVG_DOC_TOKENS = 800
+
+# Context terms together weigh this fraction of the driver + query terms,
+# so a long context cannot drown out the driver
+CONTEXT_SHARE = 0.3
+
+# Passages: short extracted lines are merged up to PASSAGE_MIN_WORDS,
+# long paragraphs are split on sentence boundaries near PASSAGE_MAX_WORDS
+PASSAGE_MIN_WORDS = 25
+PASSAGE_MAX_WORDS = 120
+PASSAGE_GAP_MARKER = "[...]"
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9\-]+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+
+STOPWORDS = frozenset("""
+a about above across after again against all also an and any are as at be because been
+before being below between both but by can could did do does doing down during each
+few for from further had has have having he her here hers him his how i if in into is it
+its itself just more most my no nor not of off on once only or other our ours out over
+own same she should so some such than that the their theirs them then there these they
+this those through to too under until up very was we were what when where which while
+who whom why will with would you your yours driving driven across large scale new
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    return [
+        t for t in _TOKEN_RE.findall((text or "").lower())
+        if t not in STOPWORDS
+    ]
+
+
+def term_profile(driver: str, query: str, context: str = "") -> dict:
+    """
+    Weighted query terms for one (driver, query) pair.
+    """
+    weights = {
+        term: 1.0
+        for term in set(tokenize(driver)) | set(tokenize(query))
+    }
+
+    context_terms = set(tokenize(context)) - set(weights)
+    if context_terms and weights:
+        context_weight = CONTEXT_SHARE * len(weights) / len(context_terms)
+        for term in context_terms:
+            weights[term] = context_weight
+
+    return weights
+
+
+def lexical_score(text: str, profile: dict) -> float:
+    """
+    BM25-style term saturation, normalized to 0..1:
+    1.0 means every profile term occurs often in the text.
+    """
+    if not text or not profile:
+        return 0.0
+
+    tokens = tokenize(text)
+    if not tokens:
+        return 0.0
+
+    tf = Counter(tokens)
+    length_norm = 1 - BM25_B + BM25_B * len(tokens) / AVG_DOC_TOKENS
+
+    matched = 0.0
+    for term, weight in profile.items():
+        f = tf.get(term, 0)
+        if f:
+            matched += weight * f / (f + BM25_K1 * length_norm)
+
+    return round(matched / sum(profile.values()), 4)
+
+
+def prefilter_score(article: str, driver: str, query: str, context: str = "") -> float:
+    return lexical_score(article, term_profile(driver, query, context))
+
+
+def passes_prefilter(score: float) -> bool:
+    return score >= PREFILTER_THRESHOLD
+
+
+# --------------------------------------------------
+# Passage selection
+# --------------------------------------------------
+def estimate_tokens(text: str) -> int:
+    # ~4 chars per token for English prose
+    return len(text) // 4 + 1
+
+
+def split_passages(text: str) -> list[str]:
+    """
+    Paragraph-sized chunks of extracted article text, in reading order.
+    """
+    passages = []
+    current = []
+
+    def flush():
+        if current:
+            passages.append(" ".join(current))
+            current.clear()
+
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line:
+            flush()
+            continue
+
+        words = len(line.split())
+        if words > PASSAGE_MAX_WORDS:
+            flush()
+            passages.extend(_split_sentences(line))
+            continue
+
+        current.append(line)
+        if sum(len(part.split()) for part in current) >= PASSAGE_MIN_WORDS:
+            flush()
+
+    flush()
+    return passages
+
+
+def _split_sentences(paragraph: str) -> list[str]:
+    chunks = []
+    current, current_words = [], 0
+
+    for sentence in _SENTENCE_RE.split(paragraph):
+        words = len(sentence.split())
+        if current and current_words + words > PASSAGE_MAX_WORDS:
+            chunks.append(" ".join(current))
+            current, current_words = [], 0
+        current.append(sentence)
+        current_words += words
+
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def rank_passages(passages: list[str], profile: dict) -> list[float]:
+    """
+    BM25 score of each passage, with IDF taken across the article's own
+    passages so boilerplate repeated on every block counts for little.
+    """
+    docs = [Counter(tokenize(p)) for p in passages]
+    if not docs or not profile:
+        return [0.0] * len(passages)
+
+    n = len(docs)
+    avg_len = sum(sum(d.values()) for d in docs) / n or 1
+    idf = {
+        term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+        for term in profile
+        for df in [sum(1 for d in docs if term in d)]
+    }
+
+    scores = []
+    for tf in docs:
+        length_norm = 1 - BM25_B + BM25_B * sum(tf.values()) / avg_len
+        score = 0.0
+        for term, weight in profile.items():
+            f = tf.get(term, 0)
+            if f:
+                score += weight * idf[term] * f * (BM25_K1 + 1) / (f + BM25_K1 * length_norm)
+        scores.append(score)
+
+    return scores
+
+
+def select_passages(text: str, driver: str, query: str, metric: str,
+                    token_budget: int) -> tuple[str, str]:
+    """
+    Fits `text` into `token_budget` by keeping the passages that best match
+    the driver/query (metric terms weigh less), in their original order.
+
+    Returns (text, strategy):
+        "full"     - the whole article fits
+        "passages" - best-matching passages, omissions marked with [...]
+        "head"     - nothing matched; the opening passages are kept
+    """
+    text = (text or "").strip()
+    if estimate_tokens(text) <= token_budget:
+        return text, "full"
+
+    passages = split_passages(text)
+    scores = rank_passages(passages, term_profile(driver, query, metric))
+
+    # Best first; ties (e.g. unmatched passages) keep reading order,
+    # so leftover budget goes to the lead paragraphs
+    order = sorted(range(len(passages)), key=lambda i: (-scores[i], i))
+
+    chosen = set()
+    used = 0
+    for i in order:
+        cost = estimate_tokens(passages[i]) + 1
+        if used + cost > token_budget:
+            continue
+        chosen.add(i)
+        used += cost
+
+    if not chosen:
+        # A single passage larger than the whole budget
+        return text[:token_budget * 4], "head"
+
+    parts = []
+    previous = -1
+    for i in sorted(chosen):
+        if i != previous + 1:
+            parts.append(PASSAGE_GAP_MARKER)
+        parts.append(passages[i])
+        previous = i
+    if previous != len(passages) - 1:
+        parts.append(PASSAGE_GAP_MARKER)
+
+    strategy = "passages" if any(scores[i] > 0 for i in chosen) else "head"
+    return "\n".join(parts), strategy
@@ -0,0 +1,134 @@
+# search_cache.py
+import hashlib
+import json
+import os
+import time
+from dotenv import load_dotenv
+
+from db import Counters, evict, get_store_connection
+
+load_dotenv()
+
+SEARCH_CACHE_DB = os.getenv("SEARCH_CACHE_DB", "search_cache.db")
+SEARCH_CACHE_TTL_HOURS = float(os.getenv("SEARCH_CACHE_TTL_HOURS", 12))
+SEARCH_CACHE_MAX_MB = float(os.getenv("SEARCH_CACHE_MAX_MB", 50))
+
+# Part of every key; bump when the cached result fields change
+CACHE_FORMAT = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_cache (
+    key         TEXT PRIMARY KEY,
+    query       TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_search_cache_accessed ON search_cache (accessed_at);
+"""
+
+_stats = Counters(hits=0, misses=0, expired=0, evictions=0)
+
+
+def enabled() -> bool:
+    return SEARCH_CACHE_TTL_HOURS > 0
+
+
+def _conn():
+    return get_store_connection(SEARCH_CACHE_DB, _SCHEMA)
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def make_key(query: str, count: int, search_lang: str, freshness: str) -> str:
+    raw = json.dumps(
+        [CACHE_FORMAT, _normalize_query(query), count, search_lang, freshness],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get(key: str):
+    """
+    Returns the cached result list, or None on miss / expiry.
+    """
+    if not enabled():
+        return None
+
+    conn = _conn()
+    row = conn.execute(
+        "SELECT payload, created_at FROM search_cache WHERE key = ?",
+        (key,)
+    ).fetchone()
+
+    now = time.time()
+
+    if row is None:
+        _stats.add("misses")
+        return None
+
+    if now - row["created_at"] > SEARCH_CACHE_TTL_HOURS * 3600:
+        with conn:
+            conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+        _stats.add("expired")
+        _stats.add("misses")
+        return None
+
+    with conn:
+        conn.execute(
+            "UPDATE search_cache SET accessed_at = ? WHERE key = ?",
+            (now, key)
+        )
+
+    _stats.add("hits")
+    return json.loads(row["payload"])
+
+
+def put(key: str, query: str, results: list[dict]):
+    if not enabled():
+        return
+
+    payload = json.dumps(results, ensure_ascii=False)
+    now = time.time()
+
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO search_cache "
+            "(key, query, payload, size, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, query, payload, len(payload), now, now)
+        )
+    _evict(conn)
+
+
+def _evict(conn):
+    """
+    Drops expired entries, then least-recently-used ones until the
+    cache fits in SEARCH_CACHE_MAX_MB.
+    """
+    removed = evict(
+        conn, "search_cache", "key", "created_at",
+        SEARCH_CACHE_TTL_HOURS * 3600, int(SEARCH_CACHE_MAX_MB * 1024 * 1024)
+    )
+    if removed:
+        _stats.add("evictions", removed)
+
+
+def stats() -> dict:
+    snapshot = _stats.snapshot()
+
+    lookups = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_rate"] = round(snapshot["hits"] / lookups, 3) if lookups else 0.0
+
+    if enabled():
+        row = _conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM search_cache"
+        ).fetchone()
+        snapshot["entries"] = row[0]
+        snapshot["bytes"] = row[1]
+
+    return snapshot
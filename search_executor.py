@@ -2,23 +2,17 @@
 from brave_client import search_brave
 
 
-def run_search(queries_by_driver: dict, days: int) -> dict:
-    all_results = {}
+def search_query(driver: str, query: str, days: int) -> list[dict]:
+    """
+    Runs one Brave search and tags every result with where it came from.
+    """
+    results = search_brave(query, days)
 
-    for driver, queries in queries_by_driver.items():
-        driver_results = {}
+    # Attach traceability metadata
+    for r in results:
+        r["query"] = query
+        r["driver"] = driver
+        r["freshness_window_days"] = days
 
-        for query in queries:
-            results = search_brave(query, days)
+    return results
 
-            # Attach traceability metadata
-            for r in results:
-                r["query"] = query
-                r["driver"] = driver
-                r["freshness_window_days"] = days
-
-            driver_results[query] = results
-
-        all_results[driver] = driver_results
-
-    return all_results
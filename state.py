@@ -1,21 +1,538 @@
+import base64
 import json
+import os
+import re
+import shutil
+import threading
+import time
 from pathlib import Path
 
+import prompt_manager
+from db import get_connection
+from prompt_manager import PromptStore
+
+# Legacy whole-file store; imported once into the default workspace, then left untouched
 STORAGE_FILE = Path("storage.json")
 
-data = {
-    "context": "",
-    "metric": "",
-    "drivers": [],
-    "queries": {},
-    "search_results": {}   # 👈 NEW
+# The default workspace keeps the original file locations; every other
+# workspace lives in WORKSPACES_DIR/<name>/ (state.db + prompts_store.json)
+DEFAULT_WORKSPACE = "default"
+STATE_DB = os.getenv("STATE_DB", "state.db")
+WORKSPACES_DIR = Path(os.getenv("WORKSPACES_DIR", "workspaces"))
+
+_WORKSPACE_NAME = re.compile(r"^[A-Za-z0-9_-]{1,40}$")
+
+SETTINGS_KEYS = ("context", "metric", "drivers")
+
+# Written by the pipeline, not by `save()`
+RUN_KEYS = ("last_successful_run", "stale_drivers")
+
+RESULT_FIELDS = (
+    "title", "url", "source", "published", "rank",
+    "prefilter_score", "score", "summary", "truncation", "searched_query",
+)
+
+# /api/results sort orders: name -> (key expression, direction).
+# Each key has a matching index below; `id` breaks ties.
+RESULT_SORTS = {
+    "score": ("COALESCE(score, -1)", "DESC"),
+    "rank": ("COALESCE(rank, 1000000)", "ASC"),
+    "recency": ("COALESCE(published, '')", "DESC"),
+}
+
+# Columns added after the first release: name -> SQL type
+_ADDED_RESULT_COLUMNS = {
+    "truncation": "TEXT",
+    "searched_query": "TEXT",
 }
 
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queries (
+    driver   TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    query    TEXT NOT NULL,
+    PRIMARY KEY (driver, position)
+);
+CREATE TABLE IF NOT EXISTS results (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    driver          TEXT NOT NULL,
+    query           TEXT NOT NULL,
+    title           TEXT,
+    url             TEXT,
+    source          TEXT,
+    published       TEXT,
+    rank            INTEGER,
+    prefilter_score REAL,
+    score           INTEGER,
+    summary         TEXT,
+    truncation      TEXT,
+    searched_query  TEXT,
+    sources         TEXT NOT NULL DEFAULT '[]',
+    created_at      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_driver_query ON results (driver, query);
+CREATE INDEX IF NOT EXISTS idx_results_driver_url ON results (driver, url);
+CREATE INDEX IF NOT EXISTS idx_results_score ON results (COALESCE(score, -1) DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_results_rank ON results (COALESCE(rank, 1000000), id);
+CREATE INDEX IF NOT EXISTS idx_results_recency ON results (COALESCE(published, '') DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_results_driver_score ON results (driver, COALESCE(score, -1) DESC, id DESC);
+CREATE TABLE IF NOT EXISTS runs (
+    job_id        TEXT PRIMARY KEY,
+    mode          TEXT NOT NULL,
+    status        TEXT NOT NULL,
+    started_at    REAL NOT NULL,
+    finished_at   REAL NOT NULL,
+    stage_timings TEXT NOT NULL,
+    progress      TEXT NOT NULL,
+    summary       TEXT
+);
+CREATE TABLE IF NOT EXISTS processed_urls (
+    driver       TEXT NOT NULL,
+    url          TEXT NOT NULL,
+    processed_at REAL NOT NULL,
+    PRIMARY KEY (driver, url)
+);
+"""
+
+_schema_ready = set()
+
+_workspaces = {}
+_workspaces_lock = threading.Lock()
+
+
+# --------------------------------------------------
+# Workspaces
+# --------------------------------------------------
+def get_workspace(name: str = DEFAULT_WORKSPACE, create: bool = False):
+    """
+    The loaded workspace called `name`, or None if it does not exist.
+    With `create`, a missing workspace is set up first, starting from a
+    copy of the default prompts. Raises ValueError for an invalid name.
+    """
+    if not _WORKSPACE_NAME.match(name or ""):
+        raise ValueError("Workspace names may only use letters, digits, '-' and '_' (max 40)")
+
+    with _workspaces_lock:
+        workspace = _workspaces.get(name)
+        if workspace is not None:
+            return workspace
+
+        if name == DEFAULT_WORKSPACE:
+            workspace = Workspace(name, STATE_DB, prompt_manager.PROMPTS_FILE)
+        else:
+            prompts_file = _prompts_file(name)
+            if not prompts_file.exists():
+                if not create:
+                    return None
+                prompts_file.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(prompt_manager.PROMPTS_FILE, prompts_file)
+            workspace = Workspace(name, WORKSPACES_DIR / name / "state.db", prompts_file)
+
+        workspace.load()
+        _workspaces[name] = workspace
+        return workspace
+
+
+def list_workspaces() -> list[str]:
+    names = {DEFAULT_WORKSPACE}
+    if WORKSPACES_DIR.is_dir():
+        names.update(
+            p.name for p in WORKSPACES_DIR.iterdir()
+            if _prompts_file(p.name).exists() and _WORKSPACE_NAME.match(p.name)
+        )
+    return sorted(names)
+
+
+def prompt_in_use(key: str, text: str) -> bool:
+    """
+    True if any workspace's prompts still have `text` under `key`.
+    Reads the prompt files only; workspaces are not loaded.
+    """
+    for name in list_workspaces():
+        path = prompt_manager.PROMPTS_FILE if name == DEFAULT_WORKSPACE else _prompts_file(name)
+        with open(path, "r", encoding="utf-8") as f:
+            if json.load(f).get(key, "").strip() == text:
+                return True
+    return False
+
+
+def _prompts_file(name: str) -> Path:
+    return WORKSPACES_DIR / name / "prompts_store.json"
+
+
+class Workspace:
+    """
+    One named, isolated set of context, metric, drivers, prompts and
+    results, stored in its own SQLite file. Everything below touches only
+    this workspace, so runs in different workspaces never share state.
+    """
+
+    def __init__(self, name: str, db_path, prompts_file):
+        self.name = name
+        self.db_path = str(db_path)
+        self.prompts = PromptStore(prompts_file)
+
+        self.data = {
+            "context": "",
+            "metric": "",
+            "drivers": [],
+            "queries": {},
+            "search_results": {},   # 👈 NEW
+            "last_successful_run": None,
+            "stale_drivers": []
+        }
+
+        # Background jobs write into `data` while requests read it
+        self.lock = threading.RLock()
+
+    def _conn(self):
+        conn = get_connection(self.db_path)
+        if self.db_path not in _schema_ready:
+            conn.executescript(_SCHEMA)
+            _add_missing_columns(conn)
+            _schema_ready.add(self.db_path)
+        return conn
+
+    # --------------------------------------------------
+    # Load / migrate
+    # --------------------------------------------------
+    def load(self):
+        conn = self._conn()
+
+        with self.lock:
+            has_settings = conn.execute("SELECT 1 FROM settings LIMIT 1").fetchone()
+            if not has_settings and self.name == DEFAULT_WORKSPACE and STORAGE_FILE.exists():
+                self._migrate_json(conn, json.loads(STORAGE_FILE.read_text()))
+
+            for row in conn.execute("SELECT key, value FROM settings"):
+                if row["key"] in SETTINGS_KEYS + RUN_KEYS:
+                    self.data[row["key"]] = json.loads(row["value"])
+
+            queries = {}
+            for row in conn.execute("SELECT driver, query FROM queries ORDER BY driver, position"):
+                queries.setdefault(row["driver"], []).append(row["query"])
+            self.data["queries"] = queries
+
+            results = {}
+            for row in conn.execute("SELECT * FROM results ORDER BY id"):
+                results.setdefault(row["driver"], {}).setdefault(row["query"], []).append(_row_to_result(row))
+            self.data["search_results"] = results
+
+    def _migrate_json(self, conn, legacy: dict):
+        """
+        One-time import of the storage.json layout, in a single transaction.
+        """
+        with conn:
+            for key in SETTINGS_KEYS:
+                if key in legacy:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                        (key, json.dumps(legacy[key]))
+                    )
+
+            for driver, queries in legacy.get("queries", {}).items():
+                _insert_queries(conn, driver, queries)
+
+            for driver, by_query in legacy.get("search_results", {}).items():
+                for query, results in by_query.items():
+                    for result in results:
+                        _insert_result(conn, driver, query, result)
+
+        print(f"Migrated {STORAGE_FILE} into {self.db_path}")
+
+    # --------------------------------------------------
+    # Writes (each one its own transaction)
+    # --------------------------------------------------
+    def save(self):
+        """
+        Persists context, metric, drivers and queries.
+        Results are written one by one via `add_result`.
+        """
+        conn = self._conn()
+
+        with self.lock, conn:
+            for key in SETTINGS_KEYS:
+                conn.execute(
+                    "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                    (key, json.dumps(self.data[key]))
+                )
+
+            conn.execute("DELETE FROM queries")
+            for driver, queries in self.data["queries"].items():
+                _insert_queries(conn, driver, queries)
+
+    def reset_results(self):
+        """
+        Clears queries, results and the processed-URL history, in memory and on disk.
+        """
+        conn = self._conn()
+
+        with self.lock, conn:
+            conn.execute("DELETE FROM queries")
+            conn.execute("DELETE FROM results")
+            conn.execute("DELETE FROM processed_urls")
+            conn.execute(
+                "DELETE FROM settings WHERE key IN (%s)" % ",".join("?" * len(RUN_KEYS)),
+                RUN_KEYS
+            )
+            self.data["queries"] = {}
+            self.data["search_results"] = {}
+            self.data["last_successful_run"] = None
+            self.data["stale_drivers"] = []
+
+    def drop_drivers(self, drivers: list[str]):
+        """
+        Removes queries, results and URL history of the given drivers only.
+        """
+        if not drivers:
+            return
+
+        conn = self._conn()
+        placeholders = ",".join("?" * len(drivers))
+
+        with self.lock, conn:
+            for table in ("queries", "results", "processed_urls"):
+                conn.execute(f"DELETE FROM {table} WHERE driver IN ({placeholders})", drivers)
+            for driver in drivers:
+                self.data["queries"].pop(driver, None)
+                self.data["search_results"].pop(driver, None)
+
+    def set_queries(self, driver: str, queries: list[str]):
+        conn = self._conn()
+
+        with self.lock, conn:
+            conn.execute("DELETE FROM queries WHERE driver = ?", (driver,))
+            _insert_queries(conn, driver, queries)
+            self.data["queries"][driver] = queries
+
+    def add_result(self, driver: str, query: str, result: dict):
+        """
+        Commits one evaluated article as soon as it is available.
+        """
+        conn = self._conn()
+
+        with self.lock, conn:
+            _insert_result(conn, driver, query, result)
+            self.data["search_results"].setdefault(driver, {}).setdefault(query, []).append(result)
+
+    def update_sources(self, url: str, sources: list, driver: str = None):
+        """
+        Records syndicated copies found after the result was stored.
+        Without `driver`, every stored copy of `url` is updated.
+        """
+        conn = self._conn()
+
+        with self.lock, conn:
+            if driver is None:
+                conn.execute(
+                    "UPDATE results SET sources = ? WHERE url = ?",
+                    (json.dumps(sources), url)
+                )
+            else:
+                conn.execute(
+                    "UPDATE results SET sources = ? WHERE driver = ? AND url = ?",
+                    (json.dumps(sources), driver, url)
+                )
+
+    # --------------------------------------------------
+    # Reads (results API)
+    # --------------------------------------------------
+    def query_results(self, driver: str = None, query: str = None, min_score: int = None,
+                      source: str = None, published_after: str = None, published_before: str = None,
+                      sort: str = "score", cursor: str = None, limit: int = 50) -> tuple[list[dict], str]:
+        """
+        One page of stored results straight from SQLite, filtered and sorted
+        server-side. Returns (results, next_cursor); next_cursor is None on
+        the last page. Raises ValueError for an unknown sort or bad cursor.
+        """
+        if sort not in RESULT_SORTS:
+            raise ValueError(f"Unknown sort '{sort}'")
+        key, direction = RESULT_SORTS[sort]
+
+        where, params = [], []
+        for column, value in (("driver", driver), ("query", query), ("source", source)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if min_score is not None:
+            where.append("score >= ?")
+            params.append(min_score)
+        if published_after is not None:
+            where.append("published >= ?")
+            params.append(published_after)
+        if published_before is not None:
+            where.append("published < ?")
+            params.append(published_before)
+
+        if cursor:
+            # Keyset pagination: continue strictly after the last row returned
+            last_key, last_id = _decode_cursor(cursor)
+            op = "<" if direction == "DESC" else ">"
+            where.append(f"({key} {op} ? OR ({key} = ? AND id {op} ?))")
+            params.extend([last_key, last_key, last_id])
+
+        sql = f"SELECT *, {key} AS sort_key FROM results"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {key} {direction}, id {direction} LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._conn().execute(sql, params).fetchall()
+        page = rows[:limit]
+
+        results = []
+        for row in page:
+            result = _row_to_result(row)
+            result.update(id=row["id"], driver=row["driver"], query=row["query"])
+            results.append(result)
+
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = _encode_cursor(page[-1]["sort_key"], page[-1]["id"])
+        return results, next_cursor
+
+    # --------------------------------------------------
+    # Incremental runs
+    # --------------------------------------------------
+    def is_processed(self, driver: str, url: str) -> bool:
+        """
+        True if an earlier run already fetched `url` (canonical) for `driver`.
+        """
+        row = self._conn().execute(
+            "SELECT 1 FROM processed_urls WHERE driver = ? AND url = ?",
+            (driver, url)
+        ).fetchone()
+        return row is not None
+
+    def mark_processed(self, driver: str, url: str):
+        conn = self._conn()
+
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO processed_urls (driver, url, processed_at) VALUES (?, ?, ?)",
+                (driver, url, time.time())
+            )
+
+    def set_last_successful_run(self, started_at: float):
+        self._set_run_key("last_successful_run", started_at)
+
+    def set_stale_drivers(self, drivers: list[str]):
+        """
+        Drivers whose queries/results are missing or outdated since the
+        last context edit; a partial run rebuilds just these.
+        """
+        self._set_run_key("stale_drivers", list(drivers))
+
+    def _set_run_key(self, key: str, value):
+        conn = self._conn()
+
+        with self.lock, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                (key, json.dumps(value))
+            )
+            self.data[key] = value
+
+    # --------------------------------------------------
+    # Run history
+    # --------------------------------------------------
+    def record_run(self, job_id: str, mode: str, status: str, started_at: float, finished_at: float,
+                   stage_timings: dict, progress: dict, summary: dict = None):
+        """
+        Stores one run's timing breakdown; kept across result resets.
+        """
+        conn = self._conn()
+
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO runs "
+                "(job_id, mode, status, started_at, finished_at, stage_timings, progress, summary) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id, mode, status, started_at, finished_at,
+                    json.dumps(stage_timings), json.dumps(progress),
+                    json.dumps(summary) if summary is not None else None
+                )
+            )
+
+    def list_runs(self, limit: int = 20) -> list[dict]:
+        runs = []
+        for row in self._conn().execute(
+            "SELECT * FROM runs ORDER BY started_at DESC LIMIT ?", (limit,)
+        ):
+            stage_timings = json.loads(row["stage_timings"])
+            runs.append({
+                "job_id": row["job_id"],
+                "mode": row["mode"],
+                "status": row["status"],
+                "started_at": row["started_at"],
+                "finished_at": row["finished_at"],
+                "seconds": round(row["finished_at"] - row["started_at"], 3),
+                "stage_seconds": {
+                    stage: round(t["finished_at"] - t["started_at"], 3)
+                    for stage, t in stage_timings.items()
+                    if t.get("started_at") and t.get("finished_at")
+                },
+                "stage_timings": stage_timings,
+                "progress": json.loads(row["progress"]),
+                "summary": json.loads(row["summary"]) if row["summary"] else None,
+            })
+        return runs
+
+
+# --------------------------------------------------
+# Helpers
+# --------------------------------------------------
+def _insert_queries(conn, driver: str, queries: list[str]):
+    conn.executemany(
+        "INSERT INTO queries (driver, position, query) VALUES (?, ?, ?)",
+        [(driver, i, q) for i, q in enumerate(queries)]
+    )
+
+
+def _insert_result(conn, driver: str, query: str, result: dict):
+    columns = ("driver", "query", *RESULT_FIELDS, "sources", "created_at")
+    conn.execute(
+        f"INSERT INTO results ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))})",
+        (
+            driver, query,
+            *(result.get(field) for field in RESULT_FIELDS),
+            json.dumps(result.get("sources", [])),
+            time.time()
+        )
+    )
+
+
+def _row_to_result(row) -> dict:
+    result = {field: row[field] for field in RESULT_FIELDS}
+    result["sources"] = json.loads(row["sources"])
+    return result
+
+
+def _add_missing_columns(conn):
+    existing = {row["name"] for row in conn.execute("PRAGMA table_info(results)")}
+    with conn:
+        for column, sql_type in _ADDED_RESULT_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE results ADD COLUMN {column} {sql_type}")
+
+
+def _encode_cursor(sort_key, row_id: int) -> str:
+    raw = json.dumps([sort_key, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
-def load():
-    global data
-    if STORAGE_FILE.exists():
-        data.update(json.loads(STORAGE_FILE.read_text()))
 
-def save():
-    STORAGE_FILE.write_text(json.dumps(data, indent=2))
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_key, row_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(row_id, int):
+        raise ValueError("Invalid cursor")
+    return sort_key, row_id
@@ -0,0 +1,62 @@
+# url_utils.py
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query params that only track the click, never select content
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "ref", "ref_src", "ref_url", "referrer", "cmpid", "ocid", "smid", "sr_share",
+    "s_cid", "guccounter", "guce_referrer", "guce_referrer_sig",
+    "outputtype", "amp",
+})
+TRACKING_PREFIXES = ("utm_", "ga_", "pk_", "mtm_", "itm_")
+
+# Host prefixes serving mobile / AMP copies of the same page
+MIRROR_HOST_PREFIXES = ("www.", "m.", "amp.", "mobile.")
+
+_AMP_PATH_RE = re.compile(r"(/amp)+/?$|/amp(?=/)", re.IGNORECASE)
+_AMP_SUFFIX_RE = re.compile(r"\.amp(\.html?)$", re.IGNORECASE)
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Stable form of a URL for use as a cache / dedup key.
+    Drops tracking params, fragments, default ports, www/mobile/AMP
+    host prefixes and AMP path variants; sorts the remaining params.
+    """
+    if not url:
+        return ""
+
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+
+    # Default ports carry no information
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+
+    for prefix in MIRROR_HOST_PREFIXES:
+        if netloc.startswith(prefix) and netloc.count(".") > 1:
+            netloc = netloc[len(prefix):]
+            break
+
+    # http and https copies of a page are the same article
+    if scheme == "http":
+        scheme = "https"
+
+    path = _AMP_SUFFIX_RE.sub(r"\1", parts.path)
+    path = _AMP_PATH_RE.sub("", path)
+    path = path.rstrip("/") or "/"
+
+    params = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking_param(k)
+    )
+
+    # Fragments are never sent to the server
+    return urlunsplit((scheme, netloc, path, urlencode(params), ""))